@@ -1,17 +1,57 @@
 import os
+import sys
 import json
+import logging
 import re
-import subprocess
-import shlex
-import os
-from typing import List, Dict, Any, Optional
+import asyncio
+import atexit
+import threading
+import hashlib
+import unicodedata
+import weakref
+import copy
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+import httpx
+from rapidfuzz import fuzz, process
 from dotenv import load_dotenv
 
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+try:
+    import h2
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import hyperscan
+    HAS_HYPERSCAN = True
+except ImportError:
+    HAS_HYPERSCAN = False
+
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    HAS_AHOCORASICK = False
+
 """
 This file contains the code for AI-based document analysis.
 It integrates with Google's Gemini AI to identify sensitive information in documents.
 """
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
 
@@ -20,54 +60,435 @@ GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
 # Check if API key exists
 if not GEMINI_API_KEY:
-    print("WARNING: GEMINI_API_KEY environment variable is not set. Please set it in your .env file.")
+    logger.warning("GEMINI_API_KEY environment variable is not set. Please set it in your .env file.")
     # You can uncomment and set a hardcoded key for testing ONLY
     # GEMINI_API_KEY = "YOUR_GEMINI_API_KEY_HERE" 
-    print(f"Environment variables: {os.environ.get('PATH')[:20]}...")
+    logger.debug("Environment variables: %s...", (os.environ.get('PATH') or '')[:20])
+
+# Gemini endpoint used for all analysis requests; the reply is streamed as server-sent events
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+GEMINI_STREAM_URL = f"{GEMINI_API_BASE}/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse"
 
+# Opt-in: skip Gemini for documents where at least REGEX_FAST_PATH_MIN_HITS confident regex
+# matches cover more than REGEX_FAST_PATH_MIN_COVERAGE of the non-whitespace characters
+PREFER_REGEX_FAST_PATH = os.environ.get("PREFER_REGEX_FAST_PATH", "").lower() in ("1", "true", "yes")
+REGEX_FAST_PATH_MIN_HITS = 3
+REGEX_FAST_PATH_MIN_COVERAGE = 0.15
+REGEX_FAST_PATH_MIN_CONFIDENCE = 85
 
-def analyze_document_text(text: str, document_type: str = "unknown") -> List[Dict[str, Any]]:
+# Documents longer than GEMINI_SHARD_SIZE characters are analyzed as overlapping
+# windows, with at most GEMINI_MAX_CONCURRENCY requests in flight per document
+GEMINI_SHARD_SIZE = 4000
+GEMINI_SHARD_OVERLAP = 200
+GEMINI_MAX_CONCURRENCY = 8
+
+# Request bodies are sent pre-encoded so the faster orjson codec is used when available
+GEMINI_HEADERS = {"Content-Type": "application/json"}
+
+def _json_dumps(obj: Any) -> bytes:
+    """Encode obj as UTF-8 JSON, using orjson when installed."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+def _json_loads(data):
     """
-    Analyze document text to identify sensitive information using Gemini AI.
+    Decode JSON from str or bytes, using orjson when installed.
+    
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the latter either way.
+    """
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# httpx async clients hold connections bound to the event loop that opened them, so keep
+# one per loop. Synchronous callers all share one background loop, so its client pools
+# connections (multiplexed over HTTP/2 when h2 is installed) to Gemini across requests,
+# whichever Flask thread makes them.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the HTTP client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HAS_HTTP2,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            timeout=httpx.Timeout(30)
+        )
+        _clients[loop] = client
+    return client
+
+async def _close_client() -> None:
+    """Close the running event loop's HTTP client, if one is open."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    """Return the background event loop used by the synchronous wrappers, starting it on first use."""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="gemini-client", daemon=True).start()
+            atexit.register(_stop_sync_loop)
+    return _sync_loop
+
+def _stop_sync_loop() -> None:
+    """Close the background loop's HTTP client at interpreter exit."""
+    try:
+        asyncio.run_coroutine_threadsafe(_close_client(), _sync_loop).result(timeout=5)
+    except Exception as e:
+        logger.error("Error closing Gemini HTTP client: %s", e)
+    _sync_loop.call_soon_threadsafe(_sync_loop.stop)
+
+# Cache of parsed Gemini results keyed by a hash of the document text.
+# Bump GEMINI_PROMPT_VERSION whenever the prompt changes so stale entries are not reused.
+GEMINI_PROMPT_VERSION = 1
+_RESPONSE_CACHE_SIZE = 1024
+_response_cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+# Optional on-disk cache shared across restarts (requires the diskcache package).
+# The cached fields are the sensitive values themselves, so it is opt-in: set
+# GEMINI_DISK_CACHE=1 to use ~/.cache/redactai/gemini, or GEMINI_CACHE_DIR to pick the location.
+GEMINI_CACHE_DIR = os.environ.get("GEMINI_CACHE_DIR")
+if not GEMINI_CACHE_DIR and os.environ.get("GEMINI_DISK_CACHE", "").lower() in ("1", "true", "yes"):
+    GEMINI_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "redactai", "gemini")
+
+def _open_disk_cache():
+    """Open the on-disk response cache, or return None if it is disabled or unavailable."""
+    if not GEMINI_CACHE_DIR:
+        return None
+    if diskcache is None:
+        logger.warning("GEMINI_CACHE_DIR is set but the diskcache package is not installed")
+        return None
+    try:
+        return diskcache.Cache(GEMINI_CACHE_DIR)
+    except OSError as e:
+        logger.warning("Could not open the Gemini disk cache at %s: %s", GEMINI_CACHE_DIR, e)
+        return None
+
+_disk_cache = _open_disk_cache()
+
+def _cache_key(text: str, document_type: str) -> str:
+    """Build the cache key for a document, ignoring whitespace differences in the OCR text."""
+    normalized = " ".join(text.split())
+    key_source = f"{GEMINI_PROMPT_VERSION}|{document_type.lower()}|{normalized}"
+    return hashlib.blake2b(key_source.encode("utf-8"), digest_size=16).hexdigest()
+
+def _cache_get(key: str) -> Optional[List[Dict[str, Any]]]:
+    """Return a copy of the cached fields for key, or None on a miss."""
+    with _response_cache_lock:
+        fields = _response_cache.get(key)
+        if fields is not None:
+            _response_cache.move_to_end(key)
+    if fields is None and _disk_cache is not None:
+        fields = _disk_cache.get(key)
+        if fields is not None:
+            _cache_put(key, fields, persist=False)
+    # Callers annotate the returned dicts, so never hand out the cached objects
+    return copy.deepcopy(fields) if fields is not None else None
+
+def _cache_put(key: str, fields: List[Dict[str, Any]], persist: bool = True) -> None:
+    """Store a copy of fields under key, evicting the least recently used entry when full."""
+    fields = copy.deepcopy(fields)
+    with _response_cache_lock:
+        _response_cache[key] = fields
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > _RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+    if persist and _disk_cache is not None:
+        _disk_cache.set(key, fields)
+
+def _run_sync(coro):
+    """Run a coroutine to completion from synchronous code (e.g. Flask handlers)."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
+
+def analyze_document_text(text: str, document_type: str = "unknown", use_cache: bool = True) -> List[Dict[str, Any]]:
+    """
+    Synchronous wrapper around analyze_document_text_async.
     
     Args:
         text: The extracted text from the document
         document_type: The type of document if known
+        use_cache: Whether to serve and store results in the response cache
         
     Returns:
         A list of identified sensitive fields with their categories
     """
-    # Print the extracted text for debugging
-    print("\n========== EXTRACTED TEXT ==========")
-    print(text[:500] + "..." if len(text) > 500 else text)
-    print("====================================\n")
+    return _run_sync(analyze_document_text_async(text, document_type, use_cache))
+
+def analyze_documents_concurrently(documents: List[Tuple[str, str]]) -> List[List[Dict[str, Any]]]:
+    """
+    Analyze several documents with their Gemini requests in flight at the same time.
     
-    # Check if API key is available
-    if not GEMINI_API_KEY:
-        print("ERROR: GEMINI_API_KEY is not set in .env file. Falling back to regex-based analysis.")
-        return analyze_with_regex(text)
+    Args:
+        documents: (text, document_type) pairs
+        
+    Returns:
+        One list of sensitive fields per input document, in the same order
+    """
+    async def gather_all():
+        return await asyncio.gather(*[analyze_document_text_async(text, document_type)
+                                      for text, document_type in documents])
+    return _run_sync(gather_all())
+
+async def analyze_document_text_async(text: str, document_type: str = "unknown", use_cache: bool = True) -> List[Dict[str, Any]]:
+    """
+    Analyze document text to identify sensitive information using Gemini AI.
+    
+    Args:
+        text: The extracted text from the document
+        document_type: The type of document if known
+        use_cache: Whether to serve and store results in the response cache
         
+    Returns:
+        A list of identified sensitive fields with their categories
+    """
+    shards = _shard_text(text)
+    if len(shards) == 1 or not GEMINI_API_KEY:
+        results = await analyze_documents_batch_async([text], document_type, use_cache)
+        return results[0]
+    
+    # Long documents are split into overlapping windows analyzed in parallel
+    logger.debug("Splitting %d characters into %d shards for analysis", len(text), len(shards))
+    semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    async def analyze_shard(shard: str) -> List[Dict[str, Any]]:
+        async with semaphore:
+            results = await analyze_documents_batch_async([shard], document_type, use_cache)
+            return results[0]
+    shard_results = await asyncio.gather(*[analyze_shard(shard) for _, shard in shards])
+    
+    # Entities in the overlaps are reported twice; keep the most confident copy
+    merged: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+    for (offset, _), fields in zip(shards, shard_results):
+        for field in fields:
+            position = field.get("position")
+            if isinstance(position, dict):
+                # Regex fallback positions are relative to the shard
+                field["position"] = {key: value + offset for key, value in position.items()}
+            key = (str(field.get("text", "")).strip().lower(), field.get("category"))
+            kept = merged.get(key)
+            if kept is None or _confidence(field) > _confidence(kept):
+                merged[key] = field
+    return list(merged.values())
+
+def _shard_text(text: str, size: int = None, overlap: int = None) -> List[Tuple[int, str]]:
+    """
+    Split text into overlapping windows so an entity cut at one window edge is whole in the next.
+    
+    Returns:
+        (offset, window) pairs covering the whole text
+    """
+    size = size or GEMINI_SHARD_SIZE
+    overlap = overlap or GEMINI_SHARD_OVERLAP
+    if len(text) <= size:
+        return [(0, text)]
+    step = size - overlap
+    return [(start, text[start:start + size]) for start in range(0, len(text) - overlap, step)]
+
+def _confidence(field: Dict[str, Any]) -> float:
+    """Return a field's confidence as a number, treating missing or malformed values as 0."""
     try:
-        # Define known non-sensitive elements for different document types
-        non_sensitive_terms = [
-            # Common government headers
-            "government of india", "govt of india", "government", "unique identification", "uidai", 
-            "issued by", "verify", "signature", "male", "female", "gender", "help", "toll free", "authority",
-            # Multilingual terms 
-            "भारत सरकार", "सरकार", "प्राधिकरण", "इंडिया", "जारी किया गया",
-            "இந்திய அரசு", "அரசு", "ஆணையம்", "வழங்கப்பட்டது",
-            "ಭಾರತ ಸರ್ಕಾರ", "ಸರ್ಕಾರ", "ಪ್ರಾಧಿಕಾರ", "ನೀಡಿದ"
-        ]
+        return float(field.get("confidence", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+def analyze_documents_batch(texts: List[str], document_type: str = "unknown", use_cache: bool = True) -> List[List[Dict[str, Any]]]:
+    """
+    Synchronous wrapper around analyze_documents_batch_async.
+    
+    Args:
+        texts: The extracted text of each document
+        document_type: The type of the documents if known
+        use_cache: Whether to serve and store results in the response cache
         
-        # Add document-specific non-sensitive terms
-        if document_type.lower() in ['aadhar', 'aadhaar']:
-            non_sensitive_terms.extend([
-                "aadhaar", "aadhar", "आधार", "ஆதார்", "ಆಧಾರ್", "ആധാർ", "ఆధార్",
-                "identification number", "unique identification", "identification authority",
-                "enrolment no", "enrollment no", "vid", "virtual id"
-            ])
+    Returns:
+        One list of sensitive fields per input document, in the same order
+    """
+    return _run_sync(analyze_documents_batch_async(texts, document_type, use_cache))
+
+def _regex_fast_path(text: str, document_type: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Return all of the regex fallback's fields if its confident matches cover the text
+    well enough to skip Gemini, otherwise None.
+    """
+    fields = analyze_with_regex(text, document_type)
+    hits = [field for field in fields if field["confidence"] >= REGEX_FAST_PATH_MIN_CONFIDENCE]
+    if len(hits) < REGEX_FAST_PATH_MIN_HITS:
+        return None
+    covered = sum(field["position"]["end"] - field["position"]["start"] for field in hits)
+    if covered / max(1, len("".join(text.split()))) <= REGEX_FAST_PATH_MIN_COVERAGE:
+        return None
+    logger.debug("Regex fast path: %d confident matches, skipping Gemini", len(hits))
+    return fields
+
+def _split_batch_response(parsed: Any, texts: List[str]) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Dispatch a parsed batch response back to per-document field lists.
+    Documents the model left out are returned as None.
+    """
+    # A single document may come back as a plain list of fields
+    if len(texts) == 1 and isinstance(parsed, list) and all(isinstance(item, dict) and "fields" not in item for item in parsed):
+        return [parsed]
+    
+    fields_by_doc: Dict[int, List[Dict[str, Any]]] = {}
+    for entry in parsed if isinstance(parsed, list) else []:
+        if isinstance(entry, dict) and isinstance(entry.get("doc"), int) and isinstance(entry.get("fields"), list):
+            fields_by_doc[entry["doc"]] = entry["fields"]
+    
+    results = []
+    for i in range(len(texts)):
+        if i not in fields_by_doc:
+            logger.warning("Gemini response has no entry for document %d", i)
+        results.append(fields_by_doc.get(i))
+    return results
+
+async def analyze_documents_batch_async(texts: List[str], document_type: str = "unknown", use_cache: bool = True) -> List[List[Dict[str, Any]]]:
+    """
+    Analyze several documents with a single Gemini request.
+    
+    Args:
+        texts: The extracted text of each document
+        document_type: The type of the documents if known
+        use_cache: Whether to serve and store results in the response cache
         
-        prompt = f"""
+    Returns:
+        One list of sensitive fields per input document, in the same order
+    """
+    if not texts:
+        return []
+    
+    # Log the extracted text for debugging; skip building the previews unless enabled
+    if logger.isEnabledFor(logging.DEBUG):
+        for text in texts:
+            preview = text if len(text) <= 500 else f"{text[:500]}..."
+            logger.debug("\n========== EXTRACTED TEXT ==========\n%s\n====================================\n", preview)
+    
+    # Check if API key is available
+    if not GEMINI_API_KEY:
+        logger.error("GEMINI_API_KEY is not set in .env file. Falling back to regex-based analysis.")
+        return [analyze_with_regex(text, document_type) for text in texts]
+    
+    # Serve repeated documents from the cache and only send the misses to Gemini
+    keys = [_cache_key(text, document_type) for text in texts]
+    results = [_cache_get(key) if use_cache else None for key in keys]
+    if PREFER_REGEX_FAST_PATH:
+        # Clear-cut documents are answered by the regex patterns alone
+        results = [fields if fields is not None else _regex_fast_path(text, document_type)
+                   for text, fields in zip(texts, results)]
+    pending = [i for i, fields in enumerate(results) if fields is None]
+    if len(pending) < len(texts):
+        logger.debug("Gemini cache hits: %d of %d document(s)", len(texts) - len(pending), len(texts))
+    
+    if pending:
+        fresh = await _request_gemini([texts[i] for i in pending], document_type)
+        for i, fields in zip(pending, fresh):
+            if fields is None:
+                # Fall back to regex-based analysis, but leave it uncached so Gemini is retried next time
+                results[i] = analyze_with_regex(texts[i], document_type)
+            else:
+                if use_cache:
+                    _cache_put(keys[i], fields)
+                results[i] = fields
+    
+    return results
+
+# Known non-sensitive elements (document headers/labels) for different document types
+NON_SENSITIVE_TERMS = (
+    # Common government headers
+    "government of india", "govt of india", "government", "unique identification", "uidai", 
+    "issued by", "verify", "signature", "male", "female", "gender", "help", "toll free", "authority",
+    # Multilingual terms 
+    "भारत सरकार", "सरकार", "प्राधिकरण", "इंडिया", "जारी किया गया",
+    "இந்திய அரசு", "அரசு", "ஆணையம்", "வழங்கப்பட்டது",
+    "ಭಾರತ ಸರ್ಕಾರ", "ಸರ್ಕಾರ", "ಪ್ರಾಧಿಕಾರ", "ನೀಡಿದ"
+)
+
+# Document-specific non-sensitive terms
+AADHAR_NON_SENSITIVE_TERMS = (
+    "aadhaar", "aadhar", "आधार", "ஆதார்", "ಆಧಾರ್", "ആധാർ", "ఆధార్",
+    "identification number", "unique identification", "identification authority",
+    "enrolment no", "enrollment no", "vid", "virtual id"
+)
+
+def _term_variant(document_type: str) -> str:
+    """Return which non-sensitive term list applies to a document type."""
+    return "aadhar" if document_type.lower() in ['aadhar', 'aadhaar'] else "default"
+
+def _non_sensitive_terms(document_type: str) -> List[str]:
+    """Return the header/label terms that should never be marked sensitive for a document type."""
+    terms = list(NON_SENSITIVE_TERMS)
+    if _term_variant(document_type) == "aadhar":
+        terms.extend(AADHAR_NON_SENSITIVE_TERMS)
+    return terms
+
+def _build_term_matcher(terms: List[str]):
+    """
+    Compile the terms into a single matcher that finds all of them in one pass over a text.
+    
+    Uses an Aho-Corasick automaton when pyahocorasick is installed, otherwise a regex alternation.
+    """
+    terms = sorted({term.lower() for term in terms}, key=len, reverse=True)
+    if HAS_AHOCORASICK:
+        automaton = ahocorasick.Automaton()
+        for term in terms:
+            automaton.add_word(term, len(term))
+        automaton.make_automaton()
+        return automaton
+    return re.compile("|".join(re.escape(term) for term in terms))
+
+_TERM_MATCHERS = {
+    "default": _build_term_matcher(_non_sensitive_terms("default")),
+    "aadhar": _build_term_matcher(_non_sensitive_terms("aadhar")),
+}
+
+def _term_spans(matcher, text: str):
+    """Yield (start, end) for every term occurrence in text."""
+    if HAS_AHOCORASICK:
+        for end, length in matcher.iter(text):
+            yield end + 1 - length, end + 1
+    else:
+        for m in matcher.finditer(text):
+            yield m.start(), m.end()
+
+def is_non_sensitive_text(text: str, document_type: str = "unknown") -> bool:
+    """
+    Check whether a piece of text consists only of known headers/labels.
+    
+    Every letter and digit of the text must be covered by whole-word occurrences of
+    the non-sensitive terms, so "GOVERNMENT" or "Male" are skipped while "Male Ravi"
+    is not and "David" does not match "vid".
+    
+    Args:
+        text: The text to check
+        document_type: The type of document if known
+        
+    Returns:
+        True if the text is a header/label and can be skipped
+    """
+    text = text.lower()
+    if not text.strip():
+        return False
+    covered = [False] * len(text)
+    for start, end in _term_spans(_TERM_MATCHERS[_term_variant(document_type)], text):
+        # Only count whole-word occurrences
+        if start > 0 and text[start - 1].isalnum():
+            continue
+        if end < len(text) and text[end].isalnum():
+            continue
+        for i in range(start, end):
+            covered[i] = True
+    return all(covered[i] or not ch.isalnum() for i, ch in enumerate(text))
+
+# Static part of the analysis prompt; the JSON braces are doubled for str.format
+_ANALYSIS_PROMPT_TEMPLATE = """
         You are an expert document analyzer with a specialty in identifying sensitive information across multiple languages.
         
         First, analyze what type of document this is (ID card, resume, certificate, financial statement, medical record, etc.).
@@ -91,345 +512,374 @@ def analyze_document_text(text: str, document_type: str = "unknown") -> List[Dic
         - DOB appears after "DOB:", "Date of Birth:", "जन्म तिथि:", "பிறந்த தேதி:", "ಹುಟ್ಟಿದ ದಿನಾಂಕ:", etc.
         
         DO NOT mark these as sensitive (these are document headers/labels):
-        {", ".join(non_sensitive_terms)}
+        {non_sensitive_terms}
+        
+        Each document below starts with a "--- DOC <number> ---" line. Analyze every document separately.
         
-        Format your response as a JSON array with this structure:
+        Format your response as a JSON array with one entry per document, using this structure:
         [
           {{
-            "text": "the exact sensitive text",
-            "category": "category name (Name, Address, Phone, Email, ID_Number, DOB, Financial)",
-            "confidence": confidence score between 0-100
+            "doc": document number,
+            "fields": [
+              {{
+                "text": "the exact sensitive text",
+                "category": "category name (Name, Address, Phone, Email, ID_Number, DOB, Financial)",
+                "confidence": confidence score between 0-100
+              }},
+              ...
+            ]
           }},
           ...
         ]
         
         Only output the JSON array, nothing else.
-        
-        Text to analyze:
-        {text}
         """
+
+# The instructions only vary with the term list, so build each variant once
+_ANALYSIS_INSTRUCTIONS = {
+    variant: _ANALYSIS_PROMPT_TEMPLATE.format(non_sensitive_terms=", ".join(_non_sensitive_terms(variant)))
+    for variant in ("default", "aadhar")
+}
+
+# generateContent bodies are spliced from pre-encoded pieces so that per request only the
+# document text is serialized. JSON escapes each character on its own, so the encoded
+# instructions with their closing quote dropped can be continued by the encoded request
+# text with its opening quote dropped.
+_REQUEST_HEAD = b'{"generationConfig":{"responseMimeType":"application/json"},"contents":[{"role":"user","parts":[{"text":'
+_ENCODED_INSTRUCTIONS = {variant: _json_dumps(instructions)[:-1] for variant, instructions in _ANALYSIS_INSTRUCTIONS.items()}
+
+def _encode_request(request_text: str, variant: str) -> bytes:
+    """Return the JSON body of a generateContent request, with the instructions inlined."""
+    return b"".join([_REQUEST_HEAD, _ENCODED_INSTRUCTIONS[variant], _json_dumps(request_text)[1:], b'}]}]}'])
+
+async def _iter_sse_data(resp: httpx.Response):
+    """
+    Yield the raw bytes of each "data:" line of a server-sent event stream.
+    
+    Lines are split from the byte stream without decoding them to str first,
+    since the JSON decoder reads UTF-8 bytes directly.
+    """
+    pending = b""
+    async for block in resp.aiter_bytes():
+        lines = (pending + block).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.startswith(b"data:"):
+                yield line[len(b"data:"):]
+    if pending.startswith(b"data:"):
+        yield pending[len(b"data:"):]
+
+async def _request_gemini(texts: List[str], document_type: str) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Send one batched analysis request to Gemini.
+    
+    Returns:
+        Parsed fields per document, or None for each document the request failed to cover
+    """
+    failed = [None] * len(texts)
+    try:
+        # Number each document so the results can be dispatched back
+        documents = "\n".join(f"--- DOC {i} ---\n{text}" for i, text in enumerate(texts))
         
-       
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ]
-        }
-        
-     
-        payload_json = json.dumps(payload)
-        
-      
-        import subprocess
-        import shlex
+        request_text = f"""
+        Documents to analyze:
+        {documents}
+        """
         
-       
-        curl_command = [
-            'curl',
-            'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent',
-            '-H', 'Content-Type: application/json',
-            '-H', f'X-goog-api-key: {GEMINI_API_KEY}',
-            '-X', 'POST',
-            '-d', payload_json
-        ]
+        payload = _encode_request(request_text, _term_variant(document_type))
         
-        # Execute the curl command
-        print(f"Calling Gemini API with model: gemini-2.0-flash")
-        print(f"API Key length: {len(GEMINI_API_KEY) if GEMINI_API_KEY else 'None'}")
-        print(f"First 4 chars of API key: {GEMINI_API_KEY[:4] if GEMINI_API_KEY else 'None'}")
-        print(f"Executing curl command: {' '.join([c if '-d' not in c and i == 0 else '...' for i, c in enumerate(curl_command)])}")
+        logger.debug("Calling Gemini API with model: %s for %d document(s)", GEMINI_MODEL, len(texts))
+        logger.debug("API Key length: %d", len(GEMINI_API_KEY))
         
-        process = subprocess.Popen(
-            curl_command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
+        client = _get_client()
+        async with client.stream("POST", GEMINI_STREAM_URL, content=payload, headers={**GEMINI_HEADERS, "X-goog-api-key": GEMINI_API_KEY}) as resp:
+            if resp.status_code != 200:
+                error_body = (await resp.aread()).decode("utf-8", "replace")
+                logger.error("Error calling Gemini API: HTTP %s: %s", resp.status_code, error_body[:200])
+                return failed
+            
+            # Each server-sent event carries a JSON chunk holding the next piece of the reply text
+            text_parts = []
+            async for data in _iter_sse_data(resp):
+                try:
+                    chunk = _json_loads(data)
+                except json.JSONDecodeError as e:
+                    logger.error("Error parsing Gemini API response chunk: %s", e)
+                    logger.debug("Raw chunk: %r", data[:200])
+                    return failed
+                candidates = chunk.get("candidates") or []
+                if candidates:
+                    for part in candidates[0].get("content", {}).get("parts", []):
+                        text_parts.append(part.get("text", ""))
         
-        stdout, stderr = process.communicate()
+        # If we couldn't extract the text correctly, let the caller fall back to regex
+        if not text_parts:
+            logger.error("Could not extract text from Gemini API response")
+            return failed
         
-        if process.returncode != 0:
-            print(f"Error calling Gemini API: {stderr}")
-            return analyze_with_regex(text)
+        response_text = "".join(text_parts)
         
         # Debug the response
-        print(f"Gemini API response received, length: {len(stdout)}")
-        print(f"Response preview: {stdout[:200]}...")
+        logger.debug("Gemini API response received, length: %d", len(response_text))
+        logger.debug("Response preview: %s...", response_text[:200])
         
-        # Parse the response
+        # The request asks for a JSON reply, so parse it directly; otherwise find the
+        # JSON content (outermost square brackets, results are nested arrays), which
+        # also drops any markdown fence around it
         try:
-            response_json = json.loads(stdout)
-            
-            # Extract text from response
-            if "candidates" in response_json and len(response_json["candidates"]) > 0:
-                candidate = response_json["candidates"][0]
-                if "content" in candidate and "parts" in candidate["content"]:
-                    response_text = candidate["content"]["parts"][0]["text"]
-                    
-                    # Find JSON content (between square brackets)
-                    json_match = re.search(r'\[.*?\]', response_text, re.DOTALL)
-                    if json_match:
-                        json_content = json_match.group(0)
-                    else:
-                       
-                        json_content = response_text
-                        
-                    # Clean the JSON content
-                    json_content = json_content.strip()
-                    
-                    # Parse the JSON
-                    try:
-                        sensitive_fields = json.loads(json_content)
-                        return sensitive_fields
-                    except json.JSONDecodeError as e:
-                        print(f"Error decoding JSON from Gemini: {e}")
-                        print(f"Raw response: {response_text}")
-                        # Fall back to regex if JSON parsing fails
-                        return analyze_with_regex(text)
-            
-            # If we couldn't extract the text correctly, fall back to regex
-            print("Could not extract text from Gemini API response")
-            return analyze_with_regex(text)
-                
-        except json.JSONDecodeError as e:
-            print(f"Error parsing Gemini API response: {e}")
-            print(f"Raw response: {stdout}")
-            return analyze_with_regex(text)
+            parsed = _json_loads(response_text)
+        except json.JSONDecodeError:
+            start = response_text.find('[')
+            end = response_text.rfind(']')
+            json_content = response_text[start:end + 1] if start != -1 and end > start else response_text.strip()
+            try:
+                parsed = _json_loads(json_content)
+            except json.JSONDecodeError as e:
+                logger.error("Error decoding JSON from Gemini: %s", e)
+                logger.debug("Raw response: %s", response_text)
+                return failed
+        return _split_batch_response(parsed, texts)
             
     except Exception as e:
-        print(f"Error using Gemini AI: {e}")
-        # Fall back to regex-based analysis
-        return analyze_with_regex(text)
+        logger.error("Error using Gemini AI: %s", e)
+        return failed
+
+# --- Regex fallback patterns, compiled once at import ---
+def _has_id_digits(value: str) -> bool:
+    return len(_ID_SEPARATOR_RE.sub('', value)) >= 10  # At least 10 digits
 
-def analyze_with_regex(text: str) -> List[Dict[str, Any]]:
+def _is_long_enough(value: str) -> bool:
+    return len(value) > 10  # Avoid too short matches
+
+_ID_SEPARATOR_RE = re.compile(r'[\s\-]')
+
+# Patterns matched on their own, keyed by rule name: (pattern, category, confidence, extra check)
+_PLAIN_RULES = {
+    # Find potential names (capitalized words)
+    "name": (r'\b[A-Z][a-z]+ [A-Z][a-z]+\b', "Name", 85, None),
+    # More aggressive pattern for names with potential OCR errors
+    "name_alt": (r'\b[A-Z][a-z]{2,} +[A-Z][a-z]{2,}\b', "Name", 75, None),
+    # Find Aadhar numbers (12 digits, may have spaces)
+    "aadhar": (r'\b\d{4}\s?\d{4}\s?\d{4}\b', "ID_Number", 95, None),
+    # More forgiving pattern for Aadhar with potential OCR errors
+    "aadhar_alt": (r'\b\d{3,4}[\s\-]?\d{3,4}[\s\-]?\d{3,4}\b', "ID_Number", 85, _has_id_digits),
+    # Find PAN numbers (10 characters, format: AAAAA0000A)
+    "pan": (r'\b[A-Z]{5}\d{4}[A-Z]\b', "ID_Number", 95, None),
+    # Find email addresses
+    "email": (r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b', "Email", 90, None),
+    # Find phone numbers (10 digits)
+    "phone": (r'\b\d{10}\b', "Phone", 85, None),
+    # Find phone numbers with country code or formatting
+    "phone_alt": (r'\b[\+]?[0-9]{1,3}[\s\-]?[0-9]{3,5}[\s\-]?[0-9]{3,5}\b', "Phone", 80, None),
+    # Find dates of birth (multiple formats)
+    "dob": (r'\b\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}\b', "DOB", 80, None),
+    # Find dates in year-first format (ISO)
+    "dob_alt": (r'\b\d{4}[-/\.]\d{1,2}[-/\.]\d{1,2}\b', "DOB", 80, None),
+    # Find potential addresses (look for common keywords and patterns)
+    "address": (r'(?i:\b(?:No|#)\.?\s*\d+\s*,?.*?(?:Road|Street|Ave|Avenue|Blvd|Boulevard|Lane|Drive|Dr).*?(?:\d{5,6})?)',
+                "Address", 75, _is_long_enough),
+}
+
+def _compile_prefilter():
+    """
+    Compile the plain patterns into a Hyperscan database that reports which of them
+    occur anywhere in a text, in one SIMD-accelerated scan. Returns None when Hyperscan
+    is not installed or rejects a pattern.
+    """
+    if not HAS_HYPERSCAN:
+        return None
+    try:
+        database = hyperscan.Database()
+        database.compile(
+            expressions=[rule[0].encode("ascii") for rule in _PLAIN_RULES.values()],
+            ids=list(range(len(_PLAIN_RULES))),
+            elements=len(_PLAIN_RULES),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(_PLAIN_RULES)
+        )
+        return database
+    except hyperscan.error as e:
+        logger.warning("Hyperscan could not compile the regex fallback patterns (%s)", e)
+        return None
+
+_PREFILTER_DB = _compile_prefilter()
+_PLAIN_GROUPS = tuple(_PLAIN_RULES)
+# Hyperscan scratch space must not be shared between threads
+_prefilter_state = threading.local()
+
+def _plain_rules_present(text: str):
+    """
+    Return the names of the plain rules that match somewhere in text, or None if that
+    is not known and every rule has to be scanned.
+    
+    Hyperscan finds which rules occur in the text in one pass, so rules that match
+    nowhere are not scanned for positions. The prefilter uses ASCII classes, so it only
+    runs on ASCII text where they agree with re.
+    """
+    if _PREFILTER_DB is None or not text.isascii():
+        return None
+    scratch = getattr(_prefilter_state, "scratch", None)
+    if scratch is None:
+        scratch = _prefilter_state.scratch = hyperscan.Scratch(_PREFILTER_DB)
+    found = set()
+    def on_match(rule_id, start, end, flags, context):
+        found.add(_PLAIN_GROUPS[rule_id])
+    try:
+        _PREFILTER_DB.scan(text.encode("ascii"), match_event_handler=on_match, scratch=scratch)
+    except hyperscan.error as e:
+        logger.warning("Hyperscan prefilter failed (%s), scanning with all patterns", e)
+        return None
+    return found
+
+# Patterns that capture the value following a label, keyed by rule name:
+# (pattern, category, confidence, extra check)
+_LABEL_RULES = {
+    # Find names after common name labels in different languages
+    "name_label": (r'(?:Name|नाम|பெயர்|ಹೆಸರು|పేరు|പേര്)[\s\:]+([\w\s]+)', "Name", 90, None),
+    "relation_label": (r'(?:S/o|D/o|W/o|C/o)[\s\:]+([\w\s]+)', "Name", 90, None),
+    "guardian_label": (r'(?:Father|Mother|Guardian)[\s\:]+([\w\s]+)', "Name", 90, None),
+    # Find text after Aadhar/Aadhaar labels
+    "aadhar_label": (r'(?:Aadhar|Aadhaar|आधार|ஆதார்|ಆಧಾರ್|ആധാർ)[\s\:]+([\d\s]{10,})', "ID_Number", 95, None),
+    "uid_label": (r'(?:UID|VID|यूआईडी|யூஐடி|ಯುಐಡಿ)[\s\:]+([\d\s]{10,})', "ID_Number", 95, None),
+    # Find phone numbers after labels
+    "phone_label": (r'(?:Phone|Mobile|Tel|फोन|मोबाइल|फ़ोन|தொலைபேசி|மொபைல்|ಫೋನ್|ಮೊಬೈಲ್)[\s\:]+([\d\s\+\-]{8,})', "Phone", 90, None),
+    # Find DOB after labels
+    "dob_label": (r'(?:DOB|Date of Birth|जन्म तिथि|பிறந்த தேதி|ಹುಟ್ಟಿದ ದಿನಾಂಕ|ജനന തീയതി|జన్మతేది)[\s\:]+([\d\s\-/\.]{6,})', "DOB", 90, None),
+    "birth_date_label": (r'(?:Born on|Birth Date)[\s\:]+([\d\s\-/\.]{6,})', "DOB", 90, None),
+    # Find addresses after labels, only if they include street/building details
+    "address_label": (r'(?:Address|Addr|पता|முகவரி|ವಿಳಾಸ|വിലാസം|చిరునామా)[\s\:]+([\w\s\d\-\.,/#]{10,})', "Address", 85, _is_long_enough),
+    "residence_label": (r'(?:Residence|Res\.|Home)[\s\:]+([\w\s\d\-\.,/#]{10,})', "Address", 85, _is_long_enough),
+}
+
+# Every rule, scanned on its own and in this order: when several fields have the same
+# text the first one found is kept, so the order decides their category and position.
+# (rule name, compiled pattern, category, confidence, extra check, whether labelled)
+_REGEX_RULES = tuple(
+    (name, re.compile(_PLAIN_RULES[name][0]), *_PLAIN_RULES[name][1:], False) if name in _PLAIN_RULES
+    else (name, re.compile(_LABEL_RULES[name][0], re.IGNORECASE), *_LABEL_RULES[name][1:], True)
+    for name in ("name", "name_alt", "name_label", "relation_label", "guardian_label",
+                 "aadhar", "aadhar_alt", "aadhar_label", "uid_label", "pan", "email",
+                 "phone", "phone_alt", "phone_label", "dob", "dob_alt", "dob_label",
+                 "birth_date_label", "address", "address_label", "residence_label")
+)
+
+class _NFKCFold(dict):
+    """
+    str.translate table mapping each character to its NFKC form when that is a single
+    character, so folding never changes string length or positions. Entries are
+    computed on first use.
+    """
+    def __missing__(self, codepoint: int):
+        folded = unicodedata.normalize("NFKC", chr(codepoint))
+        self[codepoint] = folded if len(folded) == 1 else codepoint
+        return self[codepoint]
+
+_NFKC_FOLD = _NFKCFold()
+
+def analyze_with_regex(text: str, document_type: str = "unknown") -> List[Dict[str, Any]]:
     """
     Fallback function to analyze text using regex patterns.
     Used when Gemini API is not available or has an error.
     
     Args:
         text: The text to analyze
+        document_type: The type of document if known, selects the header terms to ignore
         
     Returns:
         A list of identified sensitive fields
     """
     sensitive_fields = []
     
-    # Print for debugging
-    print("\n========== USING REGEX FALLBACK ==========")
-    print(f"Text length: {len(text)}")
-    
-    # Find potential names (capitalized words)
-    name_matches = re.finditer(r'\b[A-Z][a-z]+ [A-Z][a-z]+\b', text)
-    for match in name_matches:
-        sensitive_fields.append({
-            "text": match.group(),
-            "category": "Name",
-            "confidence": 85,
-            "position": {"start": match.start(), "end": match.end()}
-        })
-    
-    # More aggressive pattern for names with potential OCR errors
-    name_alt_matches = re.finditer(r'\b[A-Z][a-z]{2,} +[A-Z][a-z]{2,}\b', text)
-    for match in name_alt_matches:
-        sensitive_fields.append({
-            "text": match.group(),
-            "category": "Name",
-            "confidence": 75,
-            "position": {"start": match.start(), "end": match.end()}
-        })
-    
-    # Find names after common name labels in different languages
-    name_label_patterns = [
-        r'(?:Name|नाम|பெயர்|ಹೆಸರು|పేరు|പേര്)[\s\:]+([\w\s]+)',
-        r'(?:S/o|D/o|W/o|C/o)[\s\:]+([\w\s]+)',
-        r'(?:Father|Mother|Guardian)[\s\:]+([\w\s]+)',
-    ]
-    
-    for pattern in name_label_patterns:
-        for match in re.finditer(pattern, text, re.IGNORECASE):
-            if match.group(1).strip():
-                sensitive_fields.append({
-                    "text": match.group(1).strip(),
-                    "category": "Name",
-                    "confidence": 90,
-                    "position": {"start": match.start(1), "end": match.end(1)}
-                })
+    logger.debug("Using regex fallback, text length: %d", len(text))
     
-    # Find Aadhar numbers (12 digits, may have spaces)
-    aadhar_matches = re.finditer(r'\b\d{4}\s?\d{4}\s?\d{4}\b', text)
-    for match in aadhar_matches:
-        sensitive_fields.append({
-            "text": match.group(),
-            "category": "ID_Number",
-            "confidence": 95,
-            "position": {"start": match.start(), "end": match.end()}
-        })
+    # Match on a compatibility-folded copy (full-width digits, no-break spaces, ...) that
+    # keeps every position, and report the original text at the matched positions
+    scan_text = text.translate(_NFKC_FOLD)
     
-    # More forgiving pattern for Aadhar with potential OCR errors
-    aadhar_alt_matches = re.finditer(r'\b\d{3,4}[\s\-]?\d{3,4}[\s\-]?\d{3,4}\b', text)
-    for match in aadhar_alt_matches:
-        if len(re.sub(r'[\s\-]', '', match.group())) >= 10:  # At least 10 digits
+    # Each rule is scanned on its own, so one rule's match never hides another's
+    present = _plain_rules_present(scan_text)
+    for name, pattern, category, confidence, check, labelled in _REGEX_RULES:
+        if not labelled and present is not None and name not in present:
+            continue
+        for match in pattern.finditer(scan_text):
+            if labelled:
+                # The value follows the label, in the capture group
+                value = match.group(1)
+                if not value.strip() or (check and not check(value)):
+                    continue
+                start, end = match.start(1), match.end(1)
+                field_text = text[start:end].strip()
+            else:
+                if check and not check(match.group()):
+                    continue
+                start, end = match.start(), match.end()
+                field_text = text[start:end]
             sensitive_fields.append({
-                "text": match.group(),
-                "category": "ID_Number",
-                "confidence": 85,
-                "position": {"start": match.start(), "end": match.end()}
+                "text": field_text,
+                "category": category,
+                "confidence": confidence,
+                "position": {"start": start, "end": end}
             })
     
-    # Find text after Aadhar/Aadhaar labels
-    aadhar_label_patterns = [
-        r'(?:Aadhar|Aadhaar|आधार|ஆதார்|ಆಧಾರ್|ആധാർ)[\s\:]+([\d\s]{10,})',
-        r'(?:UID|VID|यूआईडी|யூஐடி|ಯುಐಡಿ)[\s\:]+([\d\s]{10,})',
-    ]
-    
-    for pattern in aadhar_label_patterns:
-        for match in re.finditer(pattern, text, re.IGNORECASE):
-            if match.group(1).strip():
-                sensitive_fields.append({
-                    "text": match.group(1).strip(),
-                    "category": "ID_Number",
-                    "confidence": 95,
-                    "position": {"start": match.start(1), "end": match.end(1)}
-                })
-    
-    # Find PAN numbers (10 characters, format: AAAAA0000A)
-    pan_matches = re.finditer(r'\b[A-Z]{5}\d{4}[A-Z]\b', text)
-    for match in pan_matches:
-        sensitive_fields.append({
-            "text": match.group(),
-            "category": "ID_Number",
-            "confidence": 95,
-            "position": {"start": match.start(), "end": match.end()}
-        })
+    # Document headers/labels such as "Toll Free" or "Issued By" look like names to the
+    # patterns; drop matches made up only of known non-sensitive terms
+    sensitive_fields = [field for field in sensitive_fields
+                        if not is_non_sensitive_text(field["text"], document_type)]
     
-    # Find email addresses
-    email_matches = re.finditer(r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b', text)
-    for match in email_matches:
-        sensitive_fields.append({
-            "text": match.group(),
-            "category": "Email",
-            "confidence": 90,
-            "position": {"start": match.start(), "end": match.end()}
-        })
-    
-    # Find phone numbers (10 digits)
-    phone_matches = re.finditer(r'\b\d{10}\b', text)
-    for match in phone_matches:
-        sensitive_fields.append({
-            "text": match.group(),
-            "category": "Phone",
-            "confidence": 85,
-            "position": {"start": match.start(), "end": match.end()}
-        })
-    
-    # Find phone numbers with country code or formatting
-    phone_alt_matches = re.finditer(r'\b[\+]?[0-9]{1,3}[\s\-]?[0-9]{3,5}[\s\-]?[0-9]{3,5}\b', text)
-    for match in phone_alt_matches:
-        sensitive_fields.append({
-            "text": match.group(),
-            "category": "Phone",
-            "confidence": 80,
-            "position": {"start": match.start(), "end": match.end()}
-        })
-    
-    # Find phone numbers after labels
-    phone_label_patterns = [
-        r'(?:Phone|Mobile|Tel|फोन|मोबाइल|फ़ोन|தொலைபேசி|மொபைல்|ಫೋನ್|ಮೊಬೈಲ್)[\s\:]+([\d\s\+\-]{8,})',
-    ]
-    
-    for pattern in phone_label_patterns:
-        for match in re.finditer(pattern, text, re.IGNORECASE):
-            if match.group(1).strip():
-                sensitive_fields.append({
-                    "text": match.group(1).strip(),
-                    "category": "Phone",
-                    "confidence": 90,
-                    "position": {"start": match.start(1), "end": match.end(1)}
-                })
-    
-    # Find dates of birth (multiple formats)
-    dob_matches = re.finditer(r'\b\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}\b', text)
-    for match in dob_matches:
-        sensitive_fields.append({
-            "text": match.group(),
-            "category": "DOB",
-            "confidence": 80,
-            "position": {"start": match.start(), "end": match.end()}
-        })
+    # Deduplicate fields with same text, keeping the first occurrence;
+    # casefold() also folds case variants lower() leaves distinct
+    unique_by_text = {}
+    for field in sensitive_fields:
+        unique_by_text.setdefault(field["text"].casefold(), field)
+    unique_fields = list(unique_by_text.values())
     
-    # Find dates in year-first format (ISO)
-    dob_alt_matches = re.finditer(r'\b\d{4}[-/\.]\d{1,2}[-/\.]\d{1,2}\b', text)
-    for match in dob_alt_matches:
-        sensitive_fields.append({
-            "text": match.group(),
-            "category": "DOB",
-            "confidence": 80,
-            "position": {"start": match.start(), "end": match.end()}
-        })
+    logger.debug("Regex found %d sensitive fields", len(unique_fields))
+    return unique_fields
     
-    # Find DOB after labels
-    dob_label_patterns = [
-        r'(?:DOB|Date of Birth|जन्म तिथि|பிறந்த தேதி|ಹುಟ್ಟಿದ ದಿನಾಂಕ|ജനന തീയതി|జన్మతేది)[\s\:]+([\d\s\-/\.]{6,})',
-        r'(?:Born on|Birth Date)[\s\:]+([\d\s\-/\.]{6,})',
-    ]
-    
-    for pattern in dob_label_patterns:
-        for match in re.finditer(pattern, text, re.IGNORECASE):
-            if match.group(1).strip():
-                sensitive_fields.append({
-                    "text": match.group(1).strip(),
-                    "category": "DOB",
-                    "confidence": 90,
-                    "position": {"start": match.start(1), "end": match.end(1)}
-                })
+def _match_fields(fields_lc: List[str], infos_lc: List[str], threshold: float = 70) -> List[int]:
+    """
+    Find the AI result matching each OCR field.
     
-    # Find potential addresses (look for common keywords and patterns)
-    address_matches = re.finditer(r'\b(?:No|#)\.?\s*\d+\s*,?.*?(?:Road|Street|Ave|Avenue|Blvd|Boulevard|Lane|Drive|Dr).*?(?:\d{5,6})?', text, re.IGNORECASE)
-    for match in address_matches:
-        if len(match.group()) > 10:  # Avoid too short matches
-            sensitive_fields.append({
-                "text": match.group(),
-                "category": "Address",
-                "confidence": 75,
-                "position": {"start": match.start(), "end": match.end()}
-            })
+    This is the hot loop of enhance_document_fields, kept free of dicts and objects
+    (plain lists of case-folded strings in, indices out) so it can be profiled on its own.
     
-    # Find addresses after labels
-    address_label_patterns = [
-        r'(?:Address|Addr|पता|முகவரி|ವಿಳಾಸ|വിലാസം|చిరునామా)[\s\:]+([\w\s\d\-\.,/#]{10,})',
-        r'(?:Residence|Res\.|Home)[\s\:]+([\w\s\d\-\.,/#]{10,})',
-    ]
-    
-    for pattern in address_label_patterns:
-        for match in re.finditer(pattern, text, re.IGNORECASE):
-            # Only include if match includes street/building details
-            if match.group(1).strip() and len(match.group(1)) > 10:
-                sensitive_fields.append({
-                    "text": match.group(1).strip(),
-                    "category": "Address",
-                    "confidence": 85,
-                    "position": {"start": match.start(1), "end": match.end(1)}
-                })
-    
-    # Deduplicate fields with same text
-    seen_texts = set()
-    unique_fields = []
-    for field in sensitive_fields:
-        text_key = field["text"].lower()
-        if text_key not in seen_texts:
-            seen_texts.add(text_key)
-            unique_fields.append(field)
+    Args:
+        fields_lc: Case-folded OCR field texts
+        infos_lc: Case-folded texts of the AI-identified fields
+        threshold: Minimum token set similarity (0-100) for a fuzzy match
+        
+    Returns:
+        For each field, the index of its matching result, or -1 if none matches
+    """
+    # Index the results by text so exact matches are a single lookup
+    exact = {}
+    for i, info_text in enumerate(infos_lc):
+        exact.setdefault(info_text, i)
     
-    print(f"Regex found {len(unique_fields)} sensitive fields")
-    print("=======================================\n")
-    return unique_fields
+    # Check for exact match first, then containment in either direction
+    matches = []
+    unmatched = []
+    for field_index, field_text in enumerate(fields_lc):
+        match = exact.get(field_text, -1)
+        if match < 0:
+            for i, info_text in enumerate(infos_lc):
+                if field_text in info_text or info_text in field_text:
+                    match = i
+                    break
+            else:
+                unmatched.append(field_index)
+        matches.append(match)
     
+    # Score the remaining fields against every result in one call (C, SIMD where
+    # available) and take the most similar result above the threshold
+    if unmatched and infos_lc:
+        scores = process.cdist([fields_lc[i] for i in unmatched], infos_lc,
+                               scorer=fuzz.token_set_ratio, score_cutoff=threshold)
+        best = scores.argmax(axis=1)
+        for row, field_index in enumerate(unmatched):
+            if scores[row, best[row]] >= threshold:
+                matches[field_index] = int(best[row])
+    return matches
+
 def enhance_document_fields(extracted_fields: List[Dict[str, Any]], document_type: str = "unknown") -> List[Dict[str, Any]]:
     """
     Enhance existing OCR fields with AI-identified categories.
@@ -446,42 +896,95 @@ def enhance_document_fields(extracted_fields: List[Dict[str, Any]], document_typ
     # Skip if no fields
     if not extracted_fields:
         return []
-        
-    # Combine all text for analysis
-    all_text = " ".join([field.get("text", "") for field in extracted_fields])
+    
+    skip, all_text = _prepare_fields(extracted_fields, document_type)
     
     # Get AI analysis of the text
     sensitive_info = analyze_document_text(all_text, document_type)
     
-    # Map AI results back to the original fields
-    enhanced_fields = []
+    return _apply_analysis(extracted_fields, skip, sensitive_info)
+
+async def enhance_document_fields_async(extracted_fields: List[Dict[str, Any]], document_type: str = "unknown") -> List[Dict[str, Any]]:
+    """
+    Async variant of enhance_document_fields.
+    
+    Args:
+        extracted_fields: The fields already extracted by OCR
+        document_type: The type of document if known
+        
+    Returns:
+        Enhanced fields with categories and confidence levels
+    """
+    if not extracted_fields:
+        return []
     
-    for field in extracted_fields:
-        field_text = field.get("text", "")
-        field_enhanced = False
+    skip, all_text = _prepare_fields(extracted_fields, document_type)
+    sensitive_info = await analyze_document_text_async(all_text, document_type)
+    return _apply_analysis(extracted_fields, skip, sensitive_info)
+
+async def enhance_batch(docs: List[Tuple[List[Dict[str, Any]], str]]) -> List[List[Dict[str, Any]]]:
+    """
+    Enhance the OCR fields of several documents with their Gemini requests in flight at the same time.
+    
+    Args:
+        docs: (extracted_fields, document_type) pairs
         
-        # Check if this field matches any identified sensitive information
-        for info in sensitive_info:
-            info_text = info.get("text", "")
-            
-            # Check for exact match or significant overlap
-            if (field_text.lower() == info_text.lower() or 
-                field_text.lower() in info_text.lower() or 
-                info_text.lower() in field_text.lower() or
-                # Check for 70% character overlap
-                len(set(field_text.lower()) & set(info_text.lower())) > 0.7 * len(set(field_text.lower()))):
-                
-                # Enhance the field with AI-identified category
-                enhanced_field = field.copy()
-                enhanced_field["category"] = info.get("category", "Unknown")
-                enhanced_field["ai_confidence"] = info.get("confidence", 70)
-                enhanced_field["reason"] = info.get("reason", "Identified as sensitive information")
-                enhanced_field["sensitive"] = True
-                enhanced_fields.append(enhanced_field)
-                field_enhanced = True
-                break
+    Returns:
+        The enhanced fields of each document, in the same order
+    """
+    return await asyncio.gather(*[enhance_document_fields_async(fields, document_type)
+                                  for fields, document_type in docs])
+
+def enhance_documents_concurrently(docs: List[Tuple[List[Dict[str, Any]], str]]) -> List[List[Dict[str, Any]]]:
+    """
+    Synchronous wrapper around enhance_batch.
+    
+    Args:
+        docs: (extracted_fields, document_type) pairs
+        
+    Returns:
+        The enhanced fields of each document, in the same order
+    """
+    return _run_sync(enhance_batch(docs))
+
+def _prepare_fields(extracted_fields: List[Dict[str, Any]], document_type: str) -> Tuple[List[bool], str]:
+    """Return which fields to skip as headers/labels, and the combined text of the others."""
+    # Headers and labels are never sensitive; leave them out of the analysis and matching
+    skip = [is_non_sensitive_text(field.get("text", ""), document_type) for field in extracted_fields]
+    
+    # Combine all text for analysis
+    all_text = " ".join(field.get("text", "") for field, skipped in zip(extracted_fields, skip) if not skipped)
+    return skip, all_text
+
+def _apply_analysis(extracted_fields: List[Dict[str, Any]], skip: List[bool], sensitive_info: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Map the AI-identified fields back onto the OCR fields."""
+    # Categories repeat across fields; interned strings compare by identity downstream
+    for info in sensitive_info:
+        if isinstance(info.get("category"), str):
+            info["category"] = sys.intern(info["category"])
+    
+    # Normalize both sides once up front: case folding Indic text is not free.
+    # casefold() rather than lower() so OCR case variants like "STRASSE" still
+    # hit the exact-match lookup instead of falling through to fuzzy scoring.
+    fields_folded = [field.get("text", "").casefold() for field, skipped in zip(extracted_fields, skip) if not skipped]
+    infos_folded = [info.get("text", "").casefold() for info in sensitive_info]
+    matches = iter(_match_fields(fields_folded, infos_folded))
+    
+    # Map AI results back to the original fields
+    enhanced_fields = []
+    for field, skipped in zip(extracted_fields, skip):
+        match_index = -1 if skipped else next(matches)
+        match = sensitive_info[match_index] if match_index >= 0 else None
         
-        if not field_enhanced:
+        if match is not None:
+            # Enhance the field with AI-identified category
+            enhanced_field = field.copy()
+            enhanced_field["category"] = match.get("category", "Unknown")
+            enhanced_field["ai_confidence"] = match.get("confidence", 70)
+            enhanced_field["reason"] = match.get("reason", "Identified as sensitive information")
+            enhanced_field["sensitive"] = True
+            enhanced_fields.append(enhanced_field)
+        else:
             # Keep the original field but mark as not sensitive
             enhanced_fields.append(field)
     
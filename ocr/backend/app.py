@@ -2,26 +2,221 @@ from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import os
 import uuid
+import itertools
+import bisect
+from types import MappingProxyType
 import pytesseract
-from PIL import Image
-import pdf2image
-import io
 import json
 import numpy as np
 import cv2
 import fitz  # PyMuPDF
-import sys
 import re
-from redact_ai import redact_image, apply_custom_redactions
-from ai_analysis import analyze_document_text, enhance_document_fields, map_coordinates
+import tempfile
+import hashlib
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from redact_ai import (redact_image, apply_custom_redactions, detect_entities_from_ocr, TEMPLATES,
+                      ocr_image_to_data, get_cached_ocr_data, cache_ocr_data, USE_TESSEROCR,
+                      OCR_CACHE_DIR)
+from pdf_render import render_pdf_pages, extract_pdf_texts, open_cached_pdf
+from ai_analysis import analyze_documents_concurrently, enhance_document_fields
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+logger = logging.getLogger(__name__)
+
+# Pages are OCR'd by parallel Tesseract processes, one per core; stop each of them
+# from also starting an OpenMP thread per core, which oversubscribes the CPU
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+OCR_MAX_WORKERS = int(os.environ.get('OCR_MAX_WORKERS', os.cpu_count() or 1))
+
+# Scanned PDF pages are rendered for OCR in grayscale at 150 DPI, and rendered and
+# recognized again at 300 DPI only when the words come out with a low mean confidence.
+# Word positions are scaled back to the 72 DPI page coordinates the frontend overlays on.
+OCR_RENDER_ZOOM = 150 / 72
+OCR_RETRY_ZOOM = 300 / 72
+OCR_RETRY_CONFIDENCE = 55
+# Images are binarized before OCR when their gray levels are this flat, or their mean
+# falls outside this range (too dark or washed out)
+PREPROCESS_MAX_STD = 40
+PREPROCESS_MEAN_RANGE = (80, 200)
+
+# Field IDs only need to be unique within the responses of this process, so a counter
+# behind a per-process random prefix stands in for a uuid4 per OCR word
+_FIELD_ID_PREFIX = uuid.uuid4().hex[:8]
+_field_ids = itertools.count()
+
+def new_field_id():
+    return f"{_FIELD_ID_PREFIX}-{next(_field_ids)}"
+
+def json_response(payload):
+    """Like jsonify, but encoded with orjson when installed; results carry thousands of fields."""
+    if HAS_ORJSON:
+        return app.response_class(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+                                  mimetype='application/json')
+    return jsonify(payload)
+
+# Text fields recognized at upload, by file_id, so analyze-document can reuse them
+# instead of extracting the text again when the client does not send them back
+_UPLOAD_FIELDS_CACHE_SIZE = 100
+_upload_fields = OrderedDict()
+_upload_fields_lock = threading.Lock()
+
+def cache_upload_fields(file_id, data_fields):
+    with _upload_fields_lock:
+        _upload_fields[file_id] = data_fields
+        _upload_fields.move_to_end(file_id)
+        while len(_upload_fields) > _UPLOAD_FIELDS_CACHE_SIZE:
+            _upload_fields.popitem(last=False)
+
+def get_upload_fields(file_id):
+    with _upload_fields_lock:
+        data_fields = _upload_fields.get(file_id)
+        if data_fields is not None:
+            _upload_fields.move_to_end(file_id)
+        return data_fields
+
+# The state of each async upload, as UPLOAD_STATUS_FOLDER/<file_id>.json, which every
+# server process can read: a status poll may reach a different gunicorn worker than the
+# upload. A finished job's fields are only kept there until a poll has collected them,
+# since they are the document's sensitive content. The folder is not one /api/download
+# serves from.
+UPLOAD_STATUS_FOLDER = 'upload_status'
+
+def save_upload_status(file_id, status, **details):
+    """Record an async upload's status ('processing', 'failed', 'done' or 'collected') and its details."""
+    try:
+        # Write to a temporary file first so readers never see a partial entry
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=UPLOAD_STATUS_FOLDER,
+                                         suffix='.tmp', delete=False) as f:
+            json.dump({'status': status, **details}, f)
+        os.replace(f.name, os.path.join(UPLOAD_STATUS_FOLDER, f"{file_id}.json"))
+    except OSError as e:
+        logger.warning("Could not record the status of upload %s: %s", file_id, e)
+
+def load_upload_status(file_id):
+    """Return the status recorded by save_upload_status for an upload, or None if there is none."""
+    try:
+        with open(os.path.join(UPLOAD_STATUS_FOLDER, f"{file_id}.json"), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read the status of upload %s: %s", file_id, e)
+        return None
+
+# Uploads sent with async=1 are processed on this pool; each one already spreads its
+# pages over all cores, so only a few run at once. Their progress is recorded with
+# save_upload_status, so any server process can report it.
+UPLOAD_MAX_WORKERS = int(os.environ.get('UPLOAD_MAX_WORKERS', 2))
+_upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS)
+
+# Extracted fields by file content and language, so a document uploaded again is not
+# rendered and recognized again. They are stored as JSON text, which also hands every
+# hit its own copy. Like the OCR cache, keeping them on disk is opt-in through
+# OCR_CACHE_DIR, since they are the document's sensitive content.
+_CONTENT_FIELDS_CACHE_SIZE = 32
+_content_fields = OrderedDict()
+_content_fields_lock = threading.Lock()
+CONTENT_FIELDS_CACHE_DIR = os.path.join(OCR_CACHE_DIR, 'uploads') if OCR_CACHE_DIR else None
+
+def file_content_key(file_path, language):
+    """Cache key of an uploaded file: the SHA-256 of its bytes, plus the OCR language."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return f"{digest.hexdigest()}-{language}"
+
+def get_content_fields(key):
+    with _content_fields_lock:
+        fields_json = _content_fields.get(key)
+        if fields_json is not None:
+            _content_fields.move_to_end(key)
+    if fields_json is None and CONTENT_FIELDS_CACHE_DIR:
+        try:
+            with open(os.path.join(CONTENT_FIELDS_CACHE_DIR, f"{key}.json"), encoding='utf-8') as f:
+                fields_json = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("Could not read cached fields %s: %s", key, e)
+            return None
+        cache_content_fields(key, fields_json, persist=False)
+    return json.loads(fields_json) if fields_json is not None else None
+
+def cache_content_fields(key, fields_json, persist=True):
+    with _content_fields_lock:
+        _content_fields[key] = fields_json
+        _content_fields.move_to_end(key)
+        while len(_content_fields) > _CONTENT_FIELDS_CACHE_SIZE:
+            _content_fields.popitem(last=False)
+    if persist and CONTENT_FIELDS_CACHE_DIR:
+        try:
+            os.makedirs(CONTENT_FIELDS_CACHE_DIR, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=CONTENT_FIELDS_CACHE_DIR,
+                                             suffix='.tmp', delete=False) as f:
+                f.write(fields_json)
+            os.replace(f.name, os.path.join(CONTENT_FIELDS_CACHE_DIR, f"{key}.json"))
+        except OSError as e:
+            logger.warning("Could not cache fields %s on disk: %s", key, e)
+
+# Fields redacted automatically for each document type: from the ePDF templates, on
+# scanned PDF pages, and on images
+EPDF_TEMPLATE_FIELDS = MappingProxyType({
+    'aadhaar': ('name', 'aadhaar_number', 'dob', 'address', 'parent_name'),
+    'aadhar': ('name', 'aadhaar_number', 'dob', 'address', 'parent_name'),
+    'eaadhaar': ('name', 'aadhaar_number', 'dob', 'address', 'gender', 'photo', 'qr_code'),
+    'pan': ('name', 'pan_number', 'dob', 'father_name'),
+    'epan': ('name', 'pan_number', 'dob', 'photo'),
+    'passport': ('name', 'passport_number', 'dob', 'nationality', 'place_of_birth', 'photo')
+})
+# The template boxes of those fields, as (x, y, w, h) page fractions, one row per field
+# the template has
+EPDF_TEMPLATE_BOXES = MappingProxyType({
+    doc_type: np.array([[TEMPLATES[doc_type][field][key] for key in ('x', 'y', 'w', 'h')]
+                        for field in fields if field in TEMPLATES.get(doc_type, {})],
+                       dtype=np.float64).reshape(-1, 4)
+    for doc_type, fields in EPDF_TEMPLATE_FIELDS.items()
+})
+PDF_AUTO_REDACT_FIELDS = MappingProxyType({
+    'aadhaar': ('name', 'aadhaar_number', 'dob', 'address'),
+    'aadhar': ('name', 'aadhaar_number', 'dob', 'address'),
+    'pan': ('name', 'pan_number', 'dob'),
+    'passport': ('name', 'passport_number', 'dob', 'nationality')
+})
+IMAGE_AUTO_REDACT_FIELDS = MappingProxyType({
+    'aadhaar': ('name', 'aadhaar_number', 'dob', 'address', 'parent_name'),
+    'aadhar': ('name', 'aadhaar_number', 'dob', 'address', 'parent_name'),
+    'pan': ('name', 'pan_number', 'dob', 'father_name'),
+    'passport': ('name', 'passport_number', 'dob', 'nationality', 'place_of_birth')
+})
+
+# (fill, border) BGR colors of the fallback image redaction boxes,
+# keyed by (is permanent, is a brush stroke)
+FALLBACK_BOX_COLORS = MappingProxyType({
+    (True, False): ((0, 0, 0), (255, 255, 255)),      # Black with white border for permanent
+    (True, True): ((0, 0, 0), (255, 255, 255)),
+    (False, True): ((0, 0, 255), (255, 255, 255)),    # Red for temporary brush
+    (False, False): ((0, 255, 255), (0, 0, 0)),       # Yellow with black border for temporary select
+})
 
 UPLOAD_FOLDER = 'uploads'
+UPLOAD_BUFFER_SIZE = 1024 * 1024
 PROCESSED_FOLDER = 'processed'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
+os.makedirs(UPLOAD_STATUS_FOLDER, exist_ok=True)
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
@@ -41,189 +236,345 @@ def upload_file():
     unique_filename = f"{uuid.uuid4()}{file_extension}"
     file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
     
-    # Save the file
-    file.save(file_path)
+    # Save the file, copying it in 1 MiB chunks rather than Werkzeug's default 16 KiB
+    file.save(file_path, buffer_size=UPLOAD_BUFFER_SIZE)
     
-    # Process the file based on type
-    if file_extension in ['.pdf']:
-        data_fields = extract_from_pdf(file_path, language)
-    elif file_extension in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']:
-        data_fields = extract_from_image(file_path, language)
-    else:
+    if file_extension not in ['.pdf', '.jpg', '.jpeg', '.png', '.bmp', '.tiff']:
         return jsonify({'error': 'Unsupported file type'}), 400
     
-    return jsonify({
+    # With async=1, extract the fields in the background and answer right away; the
+    # client polls /api/status/<file_id> for them
+    if request.form.get('async') == '1':
+        save_upload_status(unique_filename, 'processing')
+        _upload_executor.submit(run_upload_job, unique_filename, file_path, file_extension, language)
+        return json_response({
+            'file_id': unique_filename,
+            'original_filename': original_filename,
+            'language': language,
+            'status': 'processing'
+        }), 202
+    
+    data_fields = process_upload(unique_filename, file_path, file_extension, language)
+    return json_response({
         'file_id': unique_filename,
         'original_filename': original_filename,
         'language': language,
         'data_fields': data_fields
     })
 
+def process_upload(file_id, file_path, file_extension, language='eng'):
+    """Extract the text fields of an uploaded file and keep them for analyze-document."""
+    # A file with the same content was processed before: reuse its fields, with new IDs
+    content_key = file_content_key(file_path, language)
+    data_fields = get_content_fields(content_key)
+    if data_fields is not None:
+        logger.debug("Reusing the extracted fields of an identical upload for %s", file_id)
+        for field in data_fields:
+            field['id'] = new_field_id()
+    else:
+        # Process the file based on type
+        if file_extension == '.pdf':
+            data_fields = extract_from_pdf(file_path, language)
+        else:
+            data_fields = extract_from_image(file_path, language)
+        # Nothing found may also mean extraction failed, so only results are kept
+        if data_fields:
+            cache_content_fields(content_key, json.dumps(data_fields))
+    
+    cache_upload_fields(file_id, data_fields)
+    return data_fields
+
+def run_upload_job(file_id, file_path, file_extension, language='eng'):
+    """Process an async upload, recording its result where upload_status can report it."""
+    try:
+        data_fields = process_upload(file_id, file_path, file_extension, language)
+    except Exception as e:
+        logger.error("Error processing upload %s: %s", file_id, e)
+        save_upload_status(file_id, 'failed', error=f'Processing failed: {e}')
+    else:
+        save_upload_status(file_id, 'done', data_fields=data_fields)
+
+@app.route('/api/status/<file_id>', methods=['GET'])
+def upload_status(file_id):
+    """Report on a background upload, with its data fields once they are extracted."""
+    state = load_upload_status(file_id)
+    if state is not None and state['status'] == 'processing':
+        return json_response({'file_id': file_id, 'status': 'processing'}), 202
+    if state is not None and state['status'] == 'failed':
+        return json_response({'file_id': file_id, 'status': 'failed', 'error': state.get('error')}), 500
+    if state is not None and state['status'] == 'done':
+        # Hand the fields over and drop them from disk; this process keeps them in memory
+        data_fields = state['data_fields']
+        cache_upload_fields(file_id, data_fields)
+        save_upload_status(file_id, 'collected')
+    else:
+        data_fields = get_upload_fields(file_id)
+    
+    if data_fields is not None:
+        return json_response({'file_id': file_id, 'status': 'done', 'data_fields': data_fields})
+    if state is not None:
+        return jsonify({'error': 'The data fields of this upload were already collected'}), 410
+    return jsonify({'error': 'File not found'}), 404
+
 def extract_from_pdf(file_path, language='eng'):
-    data_fields = []
+    # Fields per page, filled in page order once the OCR pages are recognized
+    page_fields = []
+    # Pages without a usable text layer
+    ocr_page_numbers = []
     
     # Convert PDF to images
     try:
-        pdf_document = fitz.open(file_path)
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document.load_page(page_num)
-            
-            # First try to extract text directly from PDF
-            direct_text = page.get_text()
-            
-            # Check if we got meaningful text directly
-            if len(direct_text.strip()) > 100:
-                print(f"Page {page_num}: Using direct PDF text extraction")
-                # Create a synthetic data field with the extracted text
-                data_fields.append({
-                    'id': str(uuid.uuid4()),
-                    'text': direct_text,
-                    'page': page_num,
-                    'confidence': 90,
-                    'extraction_method': 'direct_pdf'
-                })
-            else:
-                # If not enough text was extracted directly, use OCR
-                print(f"Page {page_num}: Using OCR text extraction with language '{language}'")
-                pix = page.get_pixmap(alpha=False)
-                
-                # Convert pixmap to PIL Image
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                
-                # Extract text using OCR with the specified language
-                # Use psm=3 for automatic page segmentation
-                custom_config = f'--oem 3 --psm 3 -l {language}'
-                text = pytesseract.image_to_string(img, config=custom_config)
+        with open_cached_pdf(file_path) as pdf_document:
+            for page_num in range(pdf_document.page_count):
+                page = pdf_document.load_page(page_num)
                 
-                # Extract text using OCR
-                text = pytesseract.image_to_string(img, config=custom_config)
+                # First try to extract the words directly from the PDF's text layer, with
+                # their positions in page coordinates
+                words = page.get_text("words")
                 
+                if words:
+                    logger.debug("Page %s: Using direct PDF text extraction", page_num)
+                    page_fields.append([{
+                        'id': new_field_id(),
+                        'text': word[4],
+                        'page': page_num,
+                        'confidence': 90,
+                        'position': {
+                            'x': word[0],
+                            'y': word[1],
+                            'width': word[2] - word[0],
+                            'height': word[3] - word[1]
+                        },
+                        'language': language,
+                        'extraction_method': 'direct_pdf'
+                    } for word in words])
+                else:
+                    # If the page has no text layer, use OCR
+                    logger.debug("Page %s: Using OCR text extraction with language '%s'", page_num, language)
+                    page_fields.append([])
+                    ocr_page_numbers.append(page_num)
+        
+        if ocr_page_numbers:
+            ocr_results = {page_num: (pix, page_data, OCR_RENDER_ZOOM) for page_num, pix, page_data
+                           in ocr_rendered_pages(file_path, ocr_page_numbers, OCR_RENDER_ZOOM, language)}
+            
+            # Pages that did not come out well are worth four times the pixels; pages with
+            # no words at all are blank, and rendering them larger finds nothing either
+            confidences = {page_num: mean_ocr_confidence(page_data)
+                           for page_num, (_, page_data, _) in ocr_results.items()}
+            retry_page_numbers = [page_num for page_num, confidence in confidences.items()
+                                  if confidence is not None and confidence < OCR_RETRY_CONFIDENCE]
+            if retry_page_numbers:
+                logger.debug("Pages %s: low OCR confidence, recognizing again at higher resolution", retry_page_numbers)
+                for page_num, pix, page_data in ocr_rendered_pages(file_path, retry_page_numbers, OCR_RETRY_ZOOM, language):
+                    if (mean_ocr_confidence(page_data) or 0) > confidences[page_num]:
+                        ocr_results[page_num] = (pix, page_data, OCR_RETRY_ZOOM)
+            
+            for page_num, (pix, page_data, zoom) in ocr_results.items():
                 # Get text blocks with positions
-                page_data = extract_text_blocks(img, text, page_num, language)
-                data_fields.extend(page_data)
+                page_fields[page_num] = extract_text_blocks(pix, page_num, language, data=page_data,
+                                                            scale=zoom)
     except Exception as e:
-        print(f"Error processing PDF: {e}")
+        logger.error("Error processing PDF: %s", e)
     
-    return data_fields
+    return [field for fields in page_fields for field in fields]
+
+def ocr_rendered_pages(file_path, page_numbers, zoom, language='eng'):
+    """
+    Render PDF pages in grayscale at the given zoom and recognize them.
+    
+    Returns (page number, pixmap, image_to_data output) per page, in page_numbers order.
+    """
+    # Rasterize the pages in parallel worker processes when there are several, and view
+    # the pixmap samples as arrays rather than copying them into PIL images. samples_mv
+    # exposes MuPDF's own buffer (the samples property returns a copy); the pixmaps are
+    # kept alongside the views. PyMuPDF is not thread-safe, so the OCR threads below only
+    # get the arrays.
+    pixmaps = render_pdf_pages(file_path, page_numbers, zoom=zoom, gray=True)
+    images = [np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width) for pix in pixmaps]
+    
+    # Recognize the pages in one Tesseract run per worker, each over a contiguous run of
+    # pages, so the engine and language data are loaded once per worker rather than once
+    # per page and the runs use all cores
+    chunk_size = -(-len(images) // OCR_MAX_WORKERS)
+    chunks = [images[i:i + chunk_size] for i in range(0, len(images), chunk_size)]
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        chunk_data = executor.map(lambda chunk: ocr_pdf_pages(chunk, language), chunks)
+        ocr_data = [page_data for pages in chunk_data for page_data in pages]
+    
+    return list(zip(page_numbers, pixmaps, ocr_data))
+
+def mean_ocr_confidence(data):
+    """Mean confidence of the recognized words in image_to_data output, None if there are none."""
+    confidences = [float(conf) for word, conf in zip(data.get('text', []), data.get('conf', []))
+                   if word and word.strip() and float(conf) >= 0]
+    return sum(confidences) / len(confidences) if confidences else None
+
+def ocr_pdf_pages(images, language='eng'):
+    """
+    Run Tesseract once over several rendered pages (grayscale or RGB arrays) and split its output back per page.
+    
+    The pages are written as PNM files to a temporary directory and passed to Tesseract as
+    a list file, which it processes as one multi-page input. With the in-process
+    tesserocr engine there is no startup to amortize, so pages are recognized directly.
+    Pages recognized before are served from the OCR cache either way.
+    """
+    if USE_TESSEROCR:
+        return [ocr_image_to_data(img, language) for img in images]
+    
+    # Only send the pages missing from the cache to Tesseract
+    pages = [get_cached_ocr_data(img, language) for img in images]
+    missing = [n for n, page in enumerate(pages) if page is None]
+    if not missing:
+        return pages
+    
+    # Use psm=3 for automatic page segmentation
+    custom_config = f'--oem 3 --psm 3 -l {language}'
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_paths = []
+        for n in missing:
+            # Uncompressed PNM: the files only live for this Tesseract run, so a PNG's
+            # zlib pass on every page would be wasted work
+            image_path = os.path.join(tmp_dir, f'page_{n}.pnm')
+            image = images[n]
+            cv2.imwrite(image_path, image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+            image_paths.append(image_path)
+        list_path = os.path.join(tmp_dir, 'list.txt')
+        with open(list_path, 'w') as list_file:
+            list_file.write('\n'.join(image_paths) + '\n')
+        
+        data = pytesseract.image_to_data(list_path, config=custom_config, output_type=pytesseract.Output.DICT)
+    
+    # Tesseract numbers the pages of a list file from 1 in the order listed
+    for n in missing:
+        pages[n] = {key: [] for key in data}
+    for i, page_number in enumerate(data.get('page_num', [])):
+        page = pages[missing[int(page_number) - 1]]
+        for key, values in data.items():
+            page[key].append(values[i])
+    for n in missing:
+        cache_ocr_data(images[n], pages[n], language)
+    return pages
+
+def ocr_text_from_data(data):
+    """Rebuild the recognized text of a page from image_to_data output, one OCR line per line."""
+    lines = {}
+    for i, word in enumerate(data.get('text', [])):
+        if word and word.strip():
+            line_key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(line_key, []).append(word)
+    return '\n'.join(' '.join(words) for words in lines.values())
 
 def extract_from_image(file_path, language='eng'):
     try:
-        img = Image.open(file_path)
+        # Decode straight to grayscale with OpenCV, which is faster than PIL and gives
+        # Tesseract the single channel it works on anyway
+        gray = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError(f"Cannot read image: {file_path}")
         
         # Print image details for debugging
-        print(f"Processing image: {file_path}")
-        print(f"Image size: {img.size}, format: {img.format}, mode: {img.mode}")
+        logger.debug("Processing image: %s", file_path)
+        logger.debug("Image size: %dx%d", gray.shape[1], gray.shape[0])
         
-        # Use the specified language for OCR with custom configuration
-        # Use psm=3 for automatic page segmentation
-        custom_config = f'--oem 3 --psm 3 -l {language}'
-        text = pytesseract.image_to_string(img, config=custom_config)
+        # Low-contrast, very dark or washed-out images give few words unless binarized
+        # first; tell from the pixel statistics so Tesseract only runs once
+        mean, std = cv2.meanStdDev(gray)
+        mean, std = float(mean[0, 0]), float(std[0, 0])
+        if std < PREPROCESS_MAX_STD or not PREPROCESS_MEAN_RANGE[0] <= mean <= PREPROCESS_MEAN_RANGE[1]:
+            logger.debug("Low-quality image (mean %.1f, std %.1f), applying adaptive thresholding", mean, std)
+            gray = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                         cv2.THRESH_BINARY, 11, 2)
         
-        # Get text blocks with positions
-        data_fields = extract_text_blocks(img, text, 0, language)
+        # Use the specified language for OCR, with automatic page segmentation
+        data = ocr_image_to_data(gray, language)
         
-        # If we got very few text blocks, try preprocessing the image
-        if len(data_fields) < 5:
-            print("Few text blocks detected, trying image preprocessing...")
-            # Convert to cv2 format for preprocessing
-            img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-            
-            # Convert to grayscale
-            gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-            
-            # Apply adaptive thresholding
-            thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                          cv2.THRESH_BINARY, 11, 2)
-            
-            # Convert back to PIL
-            img_processed = Image.fromarray(thresh)
-            
-            # Try OCR again with the processed image
-            text = pytesseract.image_to_string(img_processed, config=custom_config)
-            
-            # Get text blocks with positions from processed image
-            data_fields_processed = extract_text_blocks(img_processed, text, 0, language)
-            
-            # Use the better result (more text blocks)
-            if len(data_fields_processed) > len(data_fields):
-                print(f"Using processed image results: {len(data_fields_processed)} blocks vs {len(data_fields)} blocks")
-                data_fields = data_fields_processed
+        # Get text blocks with positions
+        data_fields = extract_text_blocks(gray, 0, language, data=data)
         
         return data_fields
     except Exception as e:
-        print(f"Error processing image: {e}")
+        logger.error("Error processing image: %s", e)
         return []
 
-def extract_text_blocks(img, text, page_num, language='eng'):
+def extract_text_blocks(img, page_num, language='eng', data=None, scale=1):
+    # scale is the number of image pixels per unit of the returned positions, for pages
+    # rendered above 72 DPI
     data_fields = []
-    
-    # Configure tesseract parameters for better multi-language support
-    custom_config = f'--oem 3 --psm 3 -l {language}'
+    text = ""
+    # img is a PIL image, pixmap or array
+    if isinstance(img, np.ndarray):
+        img_height, img_width = img.shape[:2]
+    else:
+        img_width, img_height = img.width, img.height
     
     try:
-        # Use pytesseract to get data with positions, specifying language and config
-        data = pytesseract.image_to_data(img, config=custom_config, output_type=pytesseract.Output.DICT)
-        
-        # Debug: Print OCR confidence stats
-        confidences = [int(conf) for conf in data['conf'] if conf != '-1']
-        if confidences:
-            avg_conf = sum(confidences) / len(confidences)
+        # Get data with positions for the specified language, unless the caller already
+        # recognized the page
+        if data is None:
+            data = ocr_image_to_data(img, language)
+        # The same run gives the page text, for the synthetic block below
+        text = ocr_text_from_data(data)
+        
+        # Use a lower confidence threshold for non-English languages
+        conf_threshold = 40 if language != 'eng' else 60
+        
+        # Select the confident, non-empty words with one array comparison instead of
+        # checking every box (most are empty layout rows with a confidence of -1)
+        n_boxes = len(data['text'])
+        confidences = np.asarray(data['conf'], dtype=np.float64)
+        has_text = np.fromiter((bool(word.strip()) for word in data['text']), dtype=bool, count=n_boxes)
+        selected = np.flatnonzero((confidences > conf_threshold) & has_text)
         
         # Process detected text blocks
-        n_boxes = len(data['text'])
-        for i in range(n_boxes):
-            # Use a lower confidence threshold for non-English languages
-            conf_threshold = 40 if language != 'eng' else 60
-            
-            if int(data['conf'][i]) > conf_threshold:  # Lower threshold for better multi-language detection
-                if data['text'][i].strip():
-                    x, y, w, h = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
-                    data_fields.append({
-                        'id': str(uuid.uuid4()),
-                        'text': data['text'][i],
-                        'page': page_num,
-                        'confidence': int(data['conf'][i]),
-                        'position': {
-                            'x': x,
-                            'y': y,
-                            'width': w,
-                            'height': h
-                        },
-                        'language': language
-                    })
+        for i in selected.tolist():
+            data_fields.append({
+                'id': new_field_id(),
+                'text': data['text'][i],
+                'page': page_num,
+                'confidence': int(confidences[i]),
+                'position': {
+                    'x': round(data['left'][i] / scale),
+                    'y': round(data['top'][i] / scale),
+                    'width': round(data['width'][i] / scale),
+                    'height': round(data['height'][i] / scale)
+                },
+                'language': language
+            })
         
         # If we got very few blocks but have text, create a synthetic block with all text
         if len(data_fields) < 3 and text.strip():
             # Create a synthetic field with the full text
             data_fields.append({
-                'id': str(uuid.uuid4()),
+                'id': new_field_id(),
                 'text': text,
                 'page': page_num,
                 'confidence': 70,  # Moderate confidence for the whole text
                 'position': {
                     'x': 10,
                     'y': 10,
-                    'width': img.width - 20,
-                    'height': img.height - 20
+                    'width': round(img_width / scale) - 20,
+                    'height': round(img_height / scale) - 20
                 },
                 'language': language,
                 'synthetic': True
             })
     
     except Exception as e:
-        print(f"Error in text block extraction: {e}")
+        logger.error("Error in text block extraction: %s", e)
         # Create a fallback field with the raw text
         if text.strip():
             data_fields.append({
-                'id': str(uuid.uuid4()),
+                'id': new_field_id(),
                 'text': text,
                 'page': page_num,
                 'confidence': 50,  # Lower confidence for fallback method
                 'position': {
                     'x': 10,
                     'y': 10,
-                    'width': img.width - 20 if hasattr(img, 'width') else 800,
-                    'height': img.height - 20 if hasattr(img, 'height') else 1000
+                    'width': round(img_width / scale) - 20,
+                    'height': round(img_height / scale) - 20
                 },
                 'language': language,
                 'fallback': True
@@ -231,84 +582,117 @@ def extract_text_blocks(img, text, page_num, language='eng'):
     
     return data_fields
 
+def compile_text_searches(text_to_redact):
+    """
+    Compile the typed redaction texts into regexes once, for matching against page text.
+    
+    Returns (redaction_type, phrase pattern, word patterns) per non-empty item; the word
+    patterns are the fallback for multi-word texts that are not found as a whole.
+    """
+    searches = []
+    for redaction_item in text_to_redact:
+        search_text = redaction_item.get('text', '').strip()
+        if not search_text:
+            continue
+        flags = 0 if redaction_item.get('case_sensitive', False) else re.IGNORECASE
+        words = search_text.split()
+        # Page text is rebuilt with single spaces between words, so match any spacing the same way
+        phrase = re.compile(' '.join(map(re.escape, words)), flags)
+        word_patterns = [re.compile(re.escape(word), flags) for word in words if len(word) >= 3] if len(words) > 1 else []
+        searches.append((redaction_item.get('redaction_type', 'temporary'), phrase, word_patterns))
+    return searches
+
 def apply_pdf_text_redactions(file_path, output_path, text_to_redact, language='eng'):
     """Find and redact specific text in PDF by searching for typed text"""
     pdf_document = fitz.open(file_path)
     success_count = 0
+    searches = compile_text_searches(text_to_redact)
     
     try:
         for page_num in range(pdf_document.page_count):
             page = pdf_document.load_page(page_num)
             
-            for redaction_item in text_to_redact:
-                search_text = redaction_item.get('text', '').strip()
-                redaction_type = redaction_item.get('redaction_type', 'temporary')
-                case_sensitive = redaction_item.get('case_sensitive', False)
-                
-                if not search_text:
-                    continue
-                
+            # Extract the page's words once and search all the texts in them, rather than
+            # running a full-page search_for (which extracts the text again) per text
+            words = page.get_text("words")
+            if not words:
+                continue
+            word_starts = list(itertools.accumulate((len(word[4]) + 1 for word in words[:-1]), initial=0))
+            page_text = ' '.join(word[4] for word in words)
+            
+            def match_rects(match):
+                # Rectangles of the words a match overlaps, narrowed to the matched characters
+                # where the match starts or ends inside a word
+                first = bisect.bisect_right(word_starts, match.start()) - 1
+                last = bisect.bisect_right(word_starts, match.end() - 1) - 1
+                rects = []
+                for i in range(first, last + 1):
+                    rect, word = fitz.Rect(words[i][:4]), words[i][4]
+                    start = max(match.start() - word_starts[i], 0)
+                    end = min(match.end() - word_starts[i], len(word))
+                    if start > 0 or end < len(word):
+                        rect = clip_to_chars(rect, word, start, end)
+                    rects.append(rect)
+                return rects
+            
+            def clip_to_chars(rect, word, start, end):
+                # Search just the word's box for the matched part; earlier occurrences of the
+                # part in the word come first. Keep the whole word if it is not found.
+                part = word[start:end]
+                hits = page.search_for(part, clip=rect)
+                if not hits:
+                    return rect
+                hit = hits[min(word.lower().count(part.lower(), 0, start), len(hits) - 1)]
+                return fitz.Rect(hit.x0, rect.y0, hit.x1, rect.y1)
+            
+            # Permanent redactions are marked as annotations and applied to the page once,
+            # since each apply_redactions rewrites the page's content
+            has_redactions = False
+            # Highlights are drawn on one shape, written to the page's content in one commit
+            shape = page.new_shape()
+            has_highlights = False
+            for redaction_type, phrase, word_patterns in searches:
                 # Search for the text on this page
-                text_instances = page.search_for(search_text, flags=0 if case_sensitive else fitz.TEXT_SEARCH_INSENSITIVE)
+                text_instances = list(phrase.finditer(page_text))
                 
-                for rect in text_instances:
-                    # Expand the rectangle slightly to ensure full coverage
-                    expanded_rect = fitz.Rect(
-                        rect.x0 - 2,  # Add padding
-                        rect.y0 - 2,
-                        rect.x1 + 2,
-                        rect.y1 + 2
-                    )
-                    
-                    if redaction_type == 'permanent':
-                        # Permanent redaction - black rectangle
-                        page.add_redact_annot(expanded_rect)
-                        page.apply_redactions()
-                    else:
-                        # Temporary redaction - yellow highlight
-                        page.draw_rect(expanded_rect, color=(1, 0.9, 0), fill=(1, 0.9, 0, 0.7))
-                        # Add border for better visibility
-                        page.draw_rect(expanded_rect, color=(0, 0, 0), width=0.5)
-                    
-                    success_count += 1
+                # If no instances found on this page, try a more relaxed search by
+                # breaking the text into words
+                if not text_instances:
+                    text_instances = [match for pattern in word_patterns for match in pattern.finditer(page_text)]
                 
-                # If no instances found on this page and we're using plain text search
-                # Try using a more relaxed search by breaking text into words
-                if len(text_instances) == 0 and len(search_text.split()) > 1:
-                    words = search_text.split()
-                    
-                    for word in words:
-                        if len(word) < 3:  # Skip very short words
-                            continue
-                            
-                        word_instances = page.search_for(word, flags=0 if case_sensitive else fitz.TEXT_SEARCH_INSENSITIVE)
+                for match in text_instances:
+                    for rect in match_rects(match):
+                        # Expand the rectangle slightly to ensure full coverage
+                        expanded_rect = fitz.Rect(
+                            rect.x0 - 2,  # Add padding
+                            rect.y0 - 2,
+                            rect.x1 + 2,
+                            rect.y1 + 2
+                        )
                         
-                        for rect in word_instances:
-                            # Expand the rectangle slightly to ensure full coverage
-                            expanded_rect = fitz.Rect(
-                                rect.x0 - 2,
-                                rect.y0 - 2,
-                                rect.x1 + 2,
-                                rect.y1 + 2
-                            )
-                            
-                            if redaction_type == 'permanent':
-                                # Permanent redaction - black rectangle
-                                page.add_redact_annot(expanded_rect)
-                                page.apply_redactions()
-                            else:
-                                # Temporary redaction - yellow highlight
-                                page.draw_rect(expanded_rect, color=(1, 0.9, 0), fill=(1, 0.9, 0, 0.7))
+                        if redaction_type == 'permanent':
+                            # Permanent redaction - black rectangle
+                            page.add_redact_annot(expanded_rect)
+                            has_redactions = True
+                        else:
+                            # Temporary redaction - yellow highlight
+                            shape.draw_rect(expanded_rect)
+                            shape.finish(color=(1, 0.9, 0), fill=(1, 0.9, 0, 0.7))
                             # Add border for better visibility
-                            page.draw_rect(expanded_rect, color=(0, 0, 0), width=0.5)
-                            
-                            success_count += 1        # Apply all permanent redactions after processing
-        pdf_document.save(output_path)
-        
-    except Exception as e:
-        # Fallback: copy original file
+                            shape.draw_rect(expanded_rect)
+                            shape.finish(color=(0, 0, 0), width=0.5)
+                            has_highlights = True
+                    
+                    success_count += 1
+            
+            if has_highlights:
+                shape.commit()
+            if has_redactions:
+                page.apply_redactions()
         pdf_document.save(output_path)
     finally:
+        # On failure nothing is written: saving here could keep redaction marks that were
+        # never applied, leaving the text under them in the output
         pdf_document.close()
     
     return success_count
@@ -321,109 +705,73 @@ def apply_image_text_redactions(file_path, output_path, text_to_redact, language
         if img_cv is None:
             raise FileNotFoundError(f"Cannot read image: {file_path}")
         
-        # Convert to PIL for OCR
-        img_pil = Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
+        # Convert to RGB for OCR
+        img_rgb = cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB)
         
         # Get OCR data with bounding boxes
-        custom_config = f'--oem 3 --psm 3 -l {language}'
-        ocr_data = pytesseract.image_to_data(img_pil, config=custom_config, output_type=pytesseract.Output.DICT)
-        
-        # Print OCR text for debugging
-        ocr_data = pytesseract.image_to_data(img_pil, config=custom_config, output_type=pytesseract.Output.DICT)
-        
+        ocr_data = ocr_image_to_data(img_rgb, language)
+        
+        # Boxes to redact, collected as (x0, y0, x1, y1) and drawn together at the end;
+        # keyed by whether the redaction is permanent
+        boxes = {True: [], False: []}
+        
+        # Strip and lower-case the confident OCR words once, rather than for every
+        # redaction text and every word of it
+        ocr_words = [(i, ocr_text, ocr_text.lower())
+                     for i, ocr_text in enumerate(text.strip() for text in ocr_data['text'])
+                     if int(ocr_data['conf'][i]) > 30]  # Only consider confident matches
+        
+        def expanded_box(i):
+            # Expand the box slightly to ensure full coverage
+            x = max(0, ocr_data['left'][i] - 5)
+            y = max(0, ocr_data['top'][i] - 5)
+            return (x, y, x + ocr_data['width'][i] + 10, y + ocr_data['height'][i] + 10)
+        
+        # Split each text into its search words (skipping very short ones) up front
+        searches = []
         for redaction_item in text_to_redact:
             search_text = redaction_item.get('text', '').strip()
-            redaction_type = redaction_item.get('redaction_type', 'temporary')
-            case_sensitive = redaction_item.get('case_sensitive', False)
-            
             if not search_text:
                 continue
-            
+            case_sensitive = redaction_item.get('case_sensitive', False)
+            words = search_text.split()
+            if not case_sensitive:
+                search_text = search_text.lower()
+            fallback_words = [word if case_sensitive else word.lower() for word in words if len(word) >= 3] if len(words) > 1 else []
+            searches.append((search_text, case_sensitive, fallback_words, redaction_item.get('redaction_type', 'temporary') == 'permanent'))
+        
+        for search_text, case_sensitive, fallback_words, permanent in searches:
             # Search for the text in OCR results - exact matches
             exact_matches = 0
-            for i in range(len(ocr_data['text'])):
-                ocr_text = ocr_data['text'][i].strip()
-                
+            for i, ocr_text, ocr_lower in ocr_words:
                 # Check if this OCR text matches our search text
-                if case_sensitive:
-                    text_match = search_text in ocr_text
-                else:
-                    text_match = search_text.lower() in ocr_text.lower()
-                
-                if text_match and int(ocr_data['conf'][i]) > 30:  # Only consider confident matches
-                    # Get bounding box
-                    x = ocr_data['left'][i]
-                    y = ocr_data['top'][i]
-                    w = ocr_data['width'][i]
-                    h = ocr_data['height'][i]
-                    
-                    # Expand the box slightly to ensure full coverage
-                    x = max(0, x - 5)
-                    y = max(0, y - 5)
-                    w = w + 10
-                    h = h + 10
-                    
-                    if redaction_type == 'permanent':
-                        # Black box for permanent redaction
-                        cv2.rectangle(img_cv, (x, y), (x + w, y + h), (0, 0, 0), -1)
-                        cv2.rectangle(img_cv, (x, y), (x + w, y + h), (255, 255, 255), 2)
-                    else:
-                        # Yellow box for temporary redaction
-                        cv2.rectangle(img_cv, (x, y), (x + w, y + h), (0, 255, 255), -1)
-                        cv2.rectangle(img_cv, (x, y), (x + w, y + h), (0, 0, 0), 2)
-                    
+                if search_text in (ocr_text if case_sensitive else ocr_lower):
+                    boxes[permanent].append(expanded_box(i))
                     success_count += 1
                     exact_matches += 1
-                    print(f"Exact match redacted: '{search_text}' in OCR text: '{ocr_text}'")
+                    logger.debug("Exact match redacted: '%s' in OCR text: '%s'", search_text, ocr_text)
             
             # If no exact matches found, try word-by-word search
-            if exact_matches == 0 and len(search_text.split()) > 1:
-                words = search_text.split()
-                print(f"No exact match found. Trying word-by-word search for '{search_text}'")
+            if exact_matches == 0 and fallback_words:
+                logger.debug("No exact match found. Trying word-by-word search for '%s'", search_text)
                 
-                for word in words:
-                    if len(word) < 3:  # Skip very short words
-                        continue
-                    
-                    for i in range(len(ocr_data['text'])):
-                        ocr_text = ocr_data['text'][i].strip()
-                        
+                for word in fallback_words:
+                    for i, ocr_text, ocr_lower in ocr_words:
                         # Check if this OCR text contains our word
-                        if case_sensitive:
-                            word_match = word in ocr_text
-                        else:
-                            word_match = word.lower() in ocr_text.lower()
-                        
-                        if word_match and int(ocr_data['conf'][i]) > 30:
-                            # Get bounding box
-                            x = ocr_data['left'][i]
-                            y = ocr_data['top'][i]
-                            w = ocr_data['width'][i]
-                            h = ocr_data['height'][i]
-                            
-                            # Expand the box slightly
-                            x = max(0, x - 5)
-                            y = max(0, y - 5)
-                            w = w + 10
-                            h = h + 10
-                            
-                            if redaction_type == 'permanent':
-                                # Black box for permanent redaction
-                                cv2.rectangle(img_cv, (x, y), (x + w, y + h), (0, 0, 0), -1)
-                                cv2.rectangle(img_cv, (x, y), (x + w, y + h), (255, 255, 255), 2)
-                            else:
-                                # Yellow box for temporary redaction
-                                cv2.rectangle(img_cv, (x, y), (x + w, y + h), (0, 255, 255), -1)
-                                cv2.rectangle(img_cv, (x, y), (x + w, y + h), (0, 0, 0), 2)
-                            
+                        if word in (ocr_text if case_sensitive else ocr_lower):
+                            boxes[permanent].append(expanded_box(i))
                             success_count += 1
-                            print(f"Word match redacted: '{word}' from '{search_text}' in OCR text: '{ocr_text}'")
+                            logger.debug("Word match redacted: '%s' from '%s' in OCR text: '%s'", word, search_text, ocr_text)
+        
+        # Yellow boxes for temporary redactions, then black boxes for permanent ones on top
+        for permanent in (False, True):
+            color, border_color = FALLBACK_BOX_COLORS[(permanent, False)]
+            draw_boxes(img_cv, boxes[permanent], color, border_color, 2)
         
         cv2.imwrite(output_path, img_cv)
         
     except Exception as e:
         # Fallback: copy original file
-        import shutil
         shutil.copy2(file_path, output_path)
         success_count = 0
     
@@ -452,11 +800,15 @@ def redact_document():
     
     # Handle text-based redaction (manual typing method)
     if text_to_redact:
-        if file_extension == '.pdf':
-            total_redactions = apply_pdf_text_redactions(file_path, output_path, text_to_redact, language)
-        else:
-            total_redactions = apply_image_text_redactions(file_path, output_path, text_to_redact, language)
-        return jsonify({
+        try:
+            if file_extension == '.pdf':
+                total_redactions = apply_pdf_text_redactions(file_path, output_path, text_to_redact, language)
+            else:
+                total_redactions = apply_image_text_redactions(file_path, output_path, text_to_redact, language)
+        except Exception as e:
+            logger.error("Error in text-based redaction: %s", e)
+            return jsonify({'error': f'Text-based redaction failed: {str(e)}'}), 500
+        return json_response({
             'redacted_file_id': f"redacted_{file_id}",
             'total_redactions': total_redactions,
             'redaction_method': 'manual_typing'
@@ -469,7 +821,7 @@ def redact_document():
         else:
             apply_image_redactions(file_path, output_path, redactions, redaction_type, 'unknown', language)
         
-        return jsonify({
+        return json_response({
             'redacted_file_id': f"redacted_{file_id}",
             'redaction_type': redaction_type,
             'redaction_method': 'coordinate_based'
@@ -480,10 +832,19 @@ def redact_document():
 
 def apply_pdf_redactions(file_path, output_path, redactions, default_redaction_type, document_type='unknown', language='eng'):
     """Process PDF redaction with support for document-type based automatic redaction"""
+    # Nothing to redact: copy the file through rather than rewriting the PDF
+    if not redactions and document_type.lower() not in EPDF_TEMPLATE_FIELDS:
+        shutil.copyfile(file_path, output_path)
+        return
+    
     pdf_document = fitz.open(file_path)
     
     # For manual redactions provided by user
     if len(redactions) > 0:
+        # Pages with permanent redactions, applied once per page after all are marked
+        redacted_pages = set()
+        # Highlight shapes by page, each written to its page's content in one commit
+        shapes = {}
         for redaction in redactions:
             page_num = redaction.get('page', 0)
             # Use redaction-specific type if provided, otherwise use the default
@@ -504,10 +865,18 @@ def apply_pdf_redactions(file_path, output_path, redactions, default_redaction_t
                 if redaction_type == 'permanent':
                     # Permanent redaction - black rectangle
                     page.add_redact_annot(rect)
-                    page.apply_redactions()
+                    redacted_pages.add(page_num)
                 else:
                     # Temporary redaction - Gray highlight for selection
-                    page.draw_rect(rect, color=(0.7, 0.7, 0.7), fill=(0.7, 0.7, 0.7, 0.5))
+                    if page_num not in shapes:
+                        shapes[page_num] = page.new_shape()
+                    shapes[page_num].draw_rect(rect)
+                    shapes[page_num].finish(color=(0.7, 0.7, 0.7), fill=(0.7, 0.7, 0.7, 0.5))
+        
+        for shape in shapes.values():
+            shape.commit()
+        for page_num in sorted(redacted_pages):
+            pdf_document.load_page(page_num).apply_redactions()
     
     # For template-based redactions of known document types (when no manual redactions)
     else:
@@ -532,119 +901,162 @@ def apply_pdf_redactions(file_path, output_path, redactions, default_redaction_t
                 if "GOVERNMENT OF INDIA" in text_content and "UNIQUE IDENTIFICATION AUTHORITY" in text_content:
                     # This is likely an e-Aadhaar download
                     detected_doc_type = "eaadhaar"
-                    print(f"Detected ePDF type: eaadhaar")
+                    logger.debug("Detected ePDF type: eaadhaar")
             
             # For PAN cards
             elif document_type.lower() == 'pan':
                 if "INCOME TAX DEPARTMENT" in text_content and "GOVT. OF INDIA" in text_content:
                     # This is likely an e-PAN download
                     detected_doc_type = "epan"
-                    print(f"Detected ePDF type: epan")
+                    logger.debug("Detected ePDF type: epan")
             
             # For direct PDF redaction, using PyMuPDF's annotation capabilities
             if detected_doc_type in ['eaadhaar', 'epan']:
-                from redact_ai import TEMPLATES
-                
-                template = TEMPLATES.get(detected_doc_type, {})
-                
-                # Get fields to redact based on document type
-                doc_fields = {
-                    'aadhaar': ['name', 'aadhaar_number', 'dob', 'address', 'parent_name'],
-                    'aadhar': ['name', 'aadhaar_number', 'dob', 'address', 'parent_name'],
-                    'eaadhaar': ['name', 'aadhaar_number', 'dob', 'address', 'gender', 'photo', 'qr_code'],
-                    'pan': ['name', 'pan_number', 'dob', 'father_name'],
-                    'epan': ['name', 'pan_number', 'dob', 'photo'],
-                    'passport': ['name', 'passport_number', 'dob', 'nationality', 'place_of_birth', 'photo']
-                }
-                
-                fields_to_redact = doc_fields.get(detected_doc_type, [])
+                # Template boxes of the fields to redact for this document type
+                template_boxes = EPDF_TEMPLATE_BOXES[detected_doc_type]
                 
                 # Process each page with template coordinates
-                for page_num in range(pdf_document.page_count):
+                for page_num in range(pdf_document.page_count if len(template_boxes) else 0):
                     page = pdf_document.load_page(page_num)
-                    page_width = page.rect.width
-                    page_height = page.rect.height
                     
-                    for field in fields_to_redact:
-                        if field in template:
-                            coords = template[field]
-                            x = int(coords['x'] * page_width)
-                            y = int(coords['y'] * page_height)
-                            width = int(coords['w'] * page_width)
-                            height = int(coords['h'] * page_height)
-                            
-                            rect = fitz.Rect(x, y, x + width, y + height)
-                            
-                            if default_redaction_type == 'permanent':
-                                # Add permanent redaction
-                                page.add_redact_annot(rect)
-                                page.apply_redactions()
-                            else:
-                                # Add temporary redaction (yellow highlight)
-                                page.draw_rect(rect, color=(1, 0.9, 0), fill=(1, 0.9, 0, 0.5))
+                    # Scale all the boxes to the page at once: (x, y, width, height) in points
+                    boxes = (template_boxes * ([page.rect.width, page.rect.height] * 2)).astype(int)
+                    rects = [fitz.Rect(x, y, x + width, y + height) for x, y, width, height in boxes.tolist()]
+                    
+                    if default_redaction_type == 'permanent':
+                        # Add permanent redactions, applied to the page in one pass
+                        for rect in rects:
+                            page.add_redact_annot(rect)
+                        page.apply_redactions()
+                    else:
+                        # Add temporary redactions (yellow highlight), written in one commit
+                        shape = page.new_shape()
+                        for rect in rects:
+                            shape.draw_rect(rect)
+                            shape.finish(color=(1, 0.9, 0), fill=(1, 0.9, 0, 0.5))
+                        shape.commit()
                 
-                print(f"Applied template-based redactions for ePDF {detected_doc_type}")
+                logger.debug("Applied template-based redactions for ePDF %s", detected_doc_type)
                 pdf_document.save(output_path)
                 pdf_document.close()
                 return
         
         # For non-ePDFs or if we didn't perform direct PDF redaction, use image-based redaction
         # Get fields to redact from document type
-        doc_fields = {
-            'aadhaar': ['name', 'aadhaar_number', 'dob', 'address'],
-            'aadhar': ['name', 'aadhaar_number', 'dob', 'address'],
-            'pan': ['name', 'pan_number', 'dob'],
-            'passport': ['name', 'passport_number', 'dob', 'nationality']
-        }
-        
-        fields = doc_fields.get(document_type, [])
+        fields = list(PDF_AUTO_REDACT_FIELDS.get(document_type, ()))
         permanent_fields = fields if default_redaction_type == 'permanent' else []
         temporary_fields = fields if default_redaction_type != 'permanent' else []
         
-        # Process each page individually
+        # Pages with a text layer and no embedded images are redacted on the text itself, which
+        # keeps them vector and searchable; the rest are rasterized and redacted through OCR
+        raster_pages = []
         for page_num in range(pdf_document.page_count):
-            # Extract page as image
             page = pdf_document.load_page(page_num)
-            pix = page.get_pixmap()
-            
-            # Convert to PIL Image for processing
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Create a temporary file for the image
-            temp_img_path = f"temp_page_{page_num}.png"
-            img.save(temp_img_path)
-            
-            # Use our redaction engine on this page
-            redacted_img = redact_image(
-                image_path=temp_img_path,
+            if not redact_pdf_page_text(page, document_type, fields, default_redaction_type, language):
+                raster_pages.append(page_num)
+        
+        # Extract each remaining page as an image, in parallel worker processes when there
+        # are several; PyMuPDF documents are not thread-safe, so page replacement below
+        # stays on this thread
+        page_images = []
+        for pix in render_pdf_pages(file_path, raster_pages):
+            # View the pixmap's buffer as an array, without copying it, and convert to the
+            # BGR layout OpenCV uses
+            samples = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            page_images.append(cv2.cvtColor(samples, cv2.COLOR_RGB2BGR))
+        
+        # Use our redaction engine on the pages in parallel; its OCR runs in Tesseract
+        # subprocesses, so the threads are not serialized by the GIL
+        def redact_page(page_image):
+            return redact_image(
+                image=page_image,
                 doc_type=document_type,
                 permanent_fields=permanent_fields,
                 temporary_fields=temporary_fields,
                 style=default_redaction_type,
-                lang=language,
-                debug=True
+                lang=language
             )
+        
+        with ThreadPoolExecutor(max_workers=OCR_MAX_WORKERS) as executor:
+            redacted_imgs = list(executor.map(redact_page, page_images))
+        
+        for page_num, redacted_img in zip(raster_pages, redacted_imgs):
+            page = pdf_document.load_page(page_num)
             
-            # Save the redacted image temporarily
-            redacted_temp_path = f"redacted_temp_page_{page_num}.png"
-            redacted_img.save(redacted_temp_path)
-            
-            # Replace the PDF page with the redacted image
-            img_rect = page.rect
-            page.insert_image(img_rect, filename=redacted_temp_path)
-            
-            # Clean up temporary files
-            try:
-                os.remove(temp_img_path)
-                os.remove(redacted_temp_path)
-            except:
-                pass
+            # Replace the PDF page with the redacted image, handing MuPDF the raw RGB pixels
+            # as a pixmap rather than a PNG it would have to decode again
+            redacted_img = redacted_img.convert("RGB")
+            pix = fitz.Pixmap(fitz.csRGB, redacted_img.width, redacted_img.height, redacted_img.tobytes(), False)
+            page.insert_image(page.rect, pixmap=pix)
     
     pdf_document.save(output_path)
     pdf_document.close()
 
+def redact_pdf_page_text(page, document_type, fields, redaction_type, language='eng'):
+    """
+    Redact a document type's fields on a PDF page's text layer, the way redact_image does on
+    an image: detect them in the page's words, falling back to the template position for
+    fields that were not found. Returns False if the page has no text layer, or if it embeds
+    images (photos, QR codes, scans), whose content only the raster path can find and cover.
+    """
+    if page.get_images():
+        return False
+    words = page.get_text("words")
+    if not words:
+        return False
+    
+    # Lay the words out like OCR output: (x0, y0, x1, y1, word, block_no, line_no, word_no),
+    # with line numbers made unique across blocks
+    line_ids = {}
+    data = {'text': [], 'left': [], 'top': [], 'width': [], 'height': [], 'line_num': []}
+    for x0, y0, x1, y1, word, block_no, line_no, _ in words:
+        data['text'].append(word)
+        data['left'].append(x0)
+        data['top'].append(y0)
+        data['width'].append(x1 - x0)
+        data['height'].append(y1 - y0)
+        data['line_num'].append(line_ids.setdefault((block_no, line_no), len(line_ids)))
+    
+    doc_type_normalized = 'aadhaar' if document_type.lower() in ['aadhar', 'aadhaar'] else document_type.lower()
+    requested_fields = set(field.lower() for field in fields)
+    if doc_type_normalized == 'aadhaar':
+        requested_fields.add('aadhaar_number')
+    
+    boxes_by_field = detect_entities_from_ocr(data, requested_fields, lang=language)
+    rects = [fitz.Rect(x, y, x + w, y + h) for boxes in boxes_by_field.values() for x, y, w, h in boxes]
+    
+    # Fall back to template coordinates for fields that weren't detected
+    template = TEMPLATES.get(doc_type_normalized, {})
+    page_width, page_height = page.rect.width, page.rect.height
+    for field in requested_fields:
+        if field in template and not boxes_by_field.get(field):
+            coords = template[field]
+            x, y = coords['x'] * page_width, coords['y'] * page_height
+            rects.append(fitz.Rect(x, y, x + coords['w'] * page_width, y + coords['h'] * page_height))
+    
+    if redaction_type == 'permanent':
+        # Remove the text and any vector graphics under the boxes
+        for rect in rects:
+            page.add_redact_annot(rect, fill=(0, 0, 0))
+        page.apply_redactions()
+    else:
+        # Temporary redaction (yellow highlight), written to the page in one commit
+        if rects:
+            shape = page.new_shape()
+            for rect in rects:
+                shape.draw_rect(rect)
+                shape.finish(color=(1, 0.9, 0), fill=(1, 0.9, 0), fill_opacity=0.5)
+            shape.commit()
+    return True
+
 def apply_image_redactions(file_path, output_path, redactions, redaction_type, document_type='unknown', language='eng'):
     """Process image redaction using the advanced redaction library"""
+    # Nothing to redact: copy the file through rather than decoding and re-encoding it,
+    # which also loses quality on JPEGs
+    if not redactions and document_type not in IMAGE_AUTO_REDACT_FIELDS:
+        shutil.copyfile(file_path, output_path)
+        return
+    
     try:
         # If we have manual redactions, always use those first
         if len(redactions) > 0:
@@ -685,14 +1097,7 @@ def apply_image_redactions(file_path, output_path, redactions, redaction_type, d
             temporary_fields = []
             
             # Get fields to redact from document type
-            doc_fields = {
-                'aadhaar': ['name', 'aadhaar_number', 'dob', 'address', 'parent_name'],
-                'aadhar': ['name', 'aadhaar_number', 'dob', 'address', 'parent_name'],
-                'pan': ['name', 'pan_number', 'dob', 'father_name'],
-                'passport': ['name', 'passport_number', 'dob', 'nationality', 'place_of_birth']
-            }
-            
-            fields = doc_fields.get(document_type, [])
+            fields = list(IMAGE_AUTO_REDACT_FIELDS.get(document_type, ()))
             
             if redaction_type == 'permanent':
                 permanent_fields = fields
@@ -706,54 +1111,96 @@ def apply_image_redactions(file_path, output_path, redactions, redaction_type, d
                 permanent_fields=permanent_fields,
                 temporary_fields=temporary_fields,
                 style=redaction_type,
-                lang=language,  # Pass the language parameter
-                debug=True  # Enable debug to see detected fields
+                lang=language  # Pass the language parameter
             )
             img.save(output_path)
-        else:
-            # For unknown document types with no manual redactions
-            img = cv2.imread(file_path)
-            cv2.imwrite(output_path, img)
             
     except Exception as e:
-        print(f"Error in image redaction: {str(e)}")
+        logger.error("Error in image redaction: %s", e)
         # Fallback to basic redaction
+        if not redactions:
+            # No boxes to draw: copy the original through rather than re-encoding it
+            shutil.copyfile(file_path, output_path)
+            return
         img = cv2.imread(file_path)
         
-        for redaction in redactions:
-            # Get position
-            pos = redaction.get('position', {})
-            x = pos.get('x', 0)
-            y = pos.get('y', 0)
-            w = pos.get('width', 0)
-            h = pos.get('height', 0)
-            redact_method = redaction.get('method', 'select')
-            # Use redaction-specific type if provided, otherwise use the default
-            redaction_type_specific = redaction.get('redaction_type', redaction_type)
-            
-            # Choose color based on redaction type and method
-            if redaction_type_specific == 'permanent':
-                # Black for permanent
-                color = (0, 0, 0)
-                border_color = (255, 255, 255)  # White border
-            else:
-                if redact_method == 'brush':
-                    # Red for temporary brush
-                    color = (0, 0, 255)  # BGR format
-                    border_color = (255, 255, 255)  # White border
-                else:
-                    # Yellow for temporary select
-                    color = (0, 255, 255)  # BGR format - Yellow
-                    border_color = (0, 0, 0)  # Black border
-                
-            # Apply rectangle with the chosen color
-            cv2.rectangle(img, (x, y), (x + w, y + h), color, -1)
-            # Add border for visibility
-            cv2.rectangle(img, (x, y), (x + w, y + h), border_color, 1)
+        # Box corners, and the color key of each box
+        boxes, _, permanent, brush = parse_redaction_boxes(redactions, redaction_type)
+        keys = np.column_stack((permanent, brush))
+        
+        # Draw the boxes of each color together, fills first and then the borders on top
+        for key in np.unique(keys, axis=0):
+            color, border_color = FALLBACK_BOX_COLORS[tuple(key.tolist())]
+            group = boxes[(keys == key).all(axis=1)]
+            draw_boxes(img, group, color, border_color, 1)
         
         cv2.imwrite(output_path, img)
 
 
+def parse_redaction_boxes(redactions, default_type='temporary'):
+    """
+    Parse the positions and types of image redactions into arrays, once, for drawing.
+    
+    Args:
+        redactions: Redaction dicts with a 'position' of x, y, width and height
+        default_type: Redaction type of redactions that do not give their own
+        
+    Returns:
+        (boxes, valid, permanent, brush): integer (x0, y0, x1, y1) rows, and boolean arrays
+        of which boxes have a positive position and size, which are permanent, and which
+        were drawn with the brush
+    """
+    n = len(redactions)
+    xywh = np.array([[int(pos.get(key, 0)) for key in ('x', 'y', 'width', 'height')]
+                     for pos in (redaction.get('position', {}) for redaction in redactions)],
+                    dtype=np.int64).reshape(-1, 4)
+    boxes = np.hstack((xywh[:, :2], xywh[:, :2] + xywh[:, 2:]))
+    valid = (xywh > 0).all(axis=1)
+    permanent = np.fromiter((redaction.get('redaction_type', default_type) == 'permanent' for redaction in redactions),
+                            dtype=bool, count=n)
+    brush = np.fromiter((redaction.get('method', 'select') == 'brush' for redaction in redactions),
+                        dtype=bool, count=n)
+    return boxes, valid, permanent, brush
+
+def draw_boxes(img, boxes, color, border_color, thickness):
+    """
+    Draw filled, bordered boxes on an image, like cv2.rectangle per box but with the
+    fills of all boxes done before any border.
+    
+    Args:
+        img: BGR image to draw on
+        boxes: Integer array of (x0, y0, x1, y1) rows, corners inclusive
+        color: Fill color
+        border_color: Border color, drawn over all the fills
+        thickness: Border thickness
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return
+    height, width = img.shape[:2]
+    xs = np.sort(boxes[:, [0, 2]], axis=1)
+    ys = np.sort(boxes[:, [1, 3]], axis=1)
+    x0s = np.clip(xs[:, 0], 0, width).tolist()
+    y0s = np.clip(ys[:, 0], 0, height).tolist()
+    x1s = np.clip(xs[:, 1] + 1, 0, width).tolist()
+    y1s = np.clip(ys[:, 1] + 1, 0, height).tolist()
+    for x0, y0, x1, y1 in zip(x0s, y0s, x1s, y1s):
+        fill_box(img, x0, y0, x1, y1, color)
+    corners = boxes[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 4, 2).astype(np.int32)
+    cv2.polylines(img, list(corners), True, border_color, thickness)
+
+def fill_box(img, x0, y0, x1, y1, color):
+    """
+    Fill img[y0:y1, x0:x1] with a color by setting its first row and copying that row
+    to the others, which is a plain memory copy per row instead of a per-pixel fill.
+    """
+    if x0 >= x1 or y0 >= y1:
+        return
+    first_row = img[y0, x0:x1]
+    first_row[...] = color
+    img[y0 + 1:y1, x0:x1] = first_row
+
+
 def map_coordinates(text_position, document_dimensions, field_data):
     """
     Maps text positions from AI analysis to document coordinates for redaction.
@@ -801,17 +1248,76 @@ def map_coordinates(text_position, document_dimensions, field_data):
     field_data['position'] = position
     return field_data
 
+def map_coordinates_batch(fields, document_dimensions):
+    """
+    Assign document coordinates to many fields at once, computing the positions of all of
+    them as arrays instead of one field at a time.
+    
+    Fields with text positions (start/end indices) are placed as map_coordinates places
+    them; fields without any position are staggered down the page. Fields that already
+    have coordinates are left unchanged.
+    
+    Args:
+        fields: Field data dicts, updated in place
+        document_dimensions: Width and height of the document
+        
+    Returns:
+        The same fields
+    """
+    pending = [(i, field) for i, field in enumerate(fields)
+               if not (isinstance(field.get('position'), dict) and 'x' in field['position'])]
+    if not pending:
+        return fields
+    
+    doc_width = document_dimensions.get('width', 800)
+    doc_height = document_dimensions.get('height', 1000)
+    
+    n = len(pending)
+    indices = np.fromiter((i for i, _ in pending), dtype=np.int64, count=n)
+    text_lengths = np.fromiter((len(field.get('text', '')) for _, field in pending), dtype=np.int64, count=n)
+    pages = np.fromiter((field.get('page', 0) for _, field in pending), dtype=np.int64, count=n)
+    has_position = np.fromiter(('position' in field for _, field in pending), dtype=bool, count=n)
+    has_span = np.fromiter((isinstance(field.get('position'), dict) and 'start' in field['position'] and 'end' in field['position']
+                            for _, field in pending), dtype=bool, count=n)
+    starts = np.fromiter((field['position'].get('start', 0) if has_span[k] else 0 for k, (_, field) in enumerate(pending)),
+                         dtype=np.float64, count=n)
+    
+    # Same formulas as map_coordinates: y from the text position when known (assumes at most
+    # 5000 characters flowing top to bottom), otherwise staggered by page
+    span_y = (doc_height * np.minimum(starts / 5000, 0.9)).astype(np.int64)
+    page_y = int(doc_height * 0.2) + 50 * pages
+    # Fields without any position are staggered by their index in the response
+    default_y = int(doc_height * 0.1) + 50 * indices
+    
+    xs = np.where(has_position, int(doc_width * 0.2), int(doc_width * 0.1)).tolist()
+    ys = np.where(has_position, np.where(has_span, span_y, page_y), default_y).tolist()
+    widths = np.maximum(text_lengths * np.where(has_position, 10, 8), 100).tolist()
+    
+    for (_, field), x, y, width in zip(pending, xs, ys, widths):
+        field['position'] = {'x': x, 'y': y, 'width': width, 'height': 30}
+    return fields
+
 def apply_pdf_redactions_text_based(file_path, output_path, redactions, document_type='unknown', language='eng'):
     """Process PDF redaction based on selected text fields"""
     pdf_document = fitz.open(file_path)
     
     try:
+        # Group the redactions by page, so each page is loaded and rewritten once
+        page_redactions = {}
         for redaction in redactions:
             page_num = redaction.get('page', 0)
-            redaction_type = redaction.get('redaction_type', 'temporary')
-            
             if page_num < pdf_document.page_count:
-                page = pdf_document.load_page(page_num)
+                page_redactions.setdefault(page_num, []).append(redaction)
+        
+        for page_num, redactions_on_page in page_redactions.items():
+            page = pdf_document.load_page(page_num)
+            has_redactions = False
+            # Highlights are written to the page's content in one commit
+            shape = page.new_shape()
+            has_highlights = False
+            
+            for redaction in redactions_on_page:
+                redaction_type = redaction.get('redaction_type', 'temporary')
                 
                 # Get position from the field
                 pos = redaction.get('position', {})
@@ -826,22 +1332,27 @@ def apply_pdf_redactions_text_based(file_path, output_path, redactions, document
                     if redaction_type == 'permanent':
                         # Permanent redaction - black rectangle
                         page.add_redact_annot(rect)
-                        page.apply_redactions()
+                        has_redactions = True
                     else:
                         # Temporary redaction - yellow highlight
-                        page.draw_rect(rect, color=(1, 0.9, 0), fill=(1, 0.9, 0, 0.7))
+                        shape.draw_rect(rect)
+                        shape.finish(color=(1, 0.9, 0), fill=(1, 0.9, 0, 0.7))
                         # Add text label for better identification
                         field_text = redaction.get('text', '')[:20] + '...' if len(redaction.get('text', '')) > 20 else redaction.get('text', '')
-                        page.insert_text((rect.x0, rect.y0 - 5), f"REDACTED: {field_text}", fontsize=8, color=(0, 0, 0))
-        
-        pdf_document.save(output_path)
-        print(f"Text-based PDF redaction completed: {len(redactions)} fields redacted")
+                        shape.insert_text((rect.x0, rect.y0 - 5), f"REDACTED: {field_text}", fontsize=8, color=(0, 0, 0))
+                        has_highlights = True
+            
+            # Write the page's highlights and apply its permanent redactions in one pass each
+            if has_highlights:
+                shape.commit()
+            if has_redactions:
+                page.apply_redactions()
         
-    except Exception as e:
-        print(f"Error in text-based PDF redaction: {e}")
-        # Fallback: copy original file
         pdf_document.save(output_path)
+        logger.debug("Text-based PDF redaction completed: %d fields redacted", len(redactions))
     finally:
+        # On failure nothing is written: saving here could keep redaction marks that were
+        # never applied, leaving the text under them in the output
         pdf_document.close()
 
 def apply_image_redactions_text_based(file_path, output_path, redactions, document_type='unknown', language='eng'):
@@ -854,40 +1365,32 @@ def apply_image_redactions_text_based(file_path, output_path, redactions, docume
         font = cv2.FONT_HERSHEY_SIMPLEX
         font_scale = 0.5
         
-        for redaction in redactions:
-            pos = redaction.get('position', {})
-            if pos and all(k in pos for k in ['x', 'y', 'width', 'height']):
-                x = int(pos.get('x', 0))
-                y = int(pos.get('y', 0))
-                w = int(pos.get('width', 0))
-                h = int(pos.get('height', 0))
-                
-                if x > 0 and y > 0 and w > 0 and h > 0:
-                    redaction_type = redaction.get('redaction_type', 'temporary')
-                    
-                    if redaction_type == 'permanent':
-                        # Black box for permanent redaction
-                        cv2.rectangle(img_cv, (x, y), (x + w, y + h), (0, 0, 0), -1)
-                        # White border for visibility
-                        cv2.rectangle(img_cv, (x, y), (x + w, y + h), (255, 255, 255), 2)
-                        # Add "REDACTED" text
-                        cv2.putText(img_cv, "REDACTED", (x + 5, y + h//2), font, font_scale, (255, 255, 255), 1)
-                    else:
-                        # Yellow box for temporary redaction
-                        cv2.rectangle(img_cv, (x, y), (x + w, y + h), (0, 255, 255), -1)
-                        # Black border for visibility
-                        cv2.rectangle(img_cv, (x, y), (x + w, y + h), (0, 0, 0), 2)
-                        # Add field type label
-                        field_text = redaction.get('text', '')[:15] + '...' if len(redaction.get('text', '')) > 15 else redaction.get('text', '')
-                        cv2.putText(img_cv, f"TEMP: {field_text}", (x + 5, y + h//2), font, font_scale, (0, 0, 0), 1)
+        # Box corners, and which boxes are permanent, for the redactions with a position
+        boxes, valid, permanent, _ = parse_redaction_boxes(redactions)
+        
+        # Yellow boxes with a black border for temporary redaction, then black boxes with
+        # a white border for permanent redaction on top, one pass per color
+        draw_boxes(img_cv, boxes[valid & ~permanent], (0, 255, 255), (0, 0, 0), 2)
+        draw_boxes(img_cv, boxes[valid & permanent], (0, 0, 0), (255, 255, 255), 2)
+        
+        for i in np.flatnonzero(valid).tolist():
+            x0, y0, _, y1 = boxes[i].tolist()
+            origin = (x0 + 5, y0 + (y1 - y0)//2)
+            if permanent[i]:
+                # Add "REDACTED" text
+                cv2.putText(img_cv, "REDACTED", origin, font, font_scale, (255, 255, 255), 1)
+            else:
+                # Add field type label
+                text = redactions[i].get('text', '')
+                field_text = text[:15] + '...' if len(text) > 15 else text
+                cv2.putText(img_cv, f"TEMP: {field_text}", origin, font, font_scale, (0, 0, 0), 1)
         
         cv2.imwrite(output_path, img_cv)
-        print(f"Text-based image redaction completed: {len(redactions)} fields redacted")
+        logger.debug("Text-based image redaction completed: %d fields redacted", len(redactions))
         
     except Exception as e:
-        print(f"Error in text-based image redaction: {str(e)}")
+        logger.error("Error in text-based image redaction: %s", e)
         # Fallback: copy original file
-        import shutil
         shutil.copy2(file_path, output_path)
 
 @app.route('/api/get_supported_languages', methods=['GET'])
@@ -912,7 +1415,7 @@ def get_supported_languages():
         {"code": "eng+mal", "name": "English + Malayalam"}
     ]
     
-    return jsonify({
+    return json_response({
         "languages": supported_languages,
         "combined_languages": combined_languages
     })
@@ -921,14 +1424,19 @@ def get_supported_languages():
 def download_file(file_id):
     file_path = os.path.join(PROCESSED_FOLDER, file_id)
     
+    # Send files conditionally, so Range requests and repeat downloads (If-None-Match)
+    # are answered from the ETag and size without reading the whole file. max_age=0 makes
+    # clients revalidate, since redacting the same upload again overwrites its output.
+    # The file body goes through the server's wsgi.file_wrapper, i.e. sendfile(2) on gunicorn.
+    
     # First try the processed folder
     if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
+        return send_file(file_path, as_attachment=True, conditional=True, etag=True, max_age=0)
     
     # If not found in processed, try the uploads folder
     file_path = os.path.join(UPLOAD_FOLDER, file_id)
     if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
+        return send_file(file_path, as_attachment=True, conditional=True, etag=True, max_age=0)
     
     return jsonify({'error': 'File not found'}), 404
 
@@ -980,7 +1488,7 @@ def redact_by_text():
         else:
             success_count = apply_image_text_redactions(file_path, output_path, text_to_redact, language)
         
-        return jsonify({
+        return json_response({
             'redacted_file_id': f"redacted_{file_id}",
             'total_redactions_requested': len(text_to_redact),
             'successful_redactions': success_count,
@@ -988,90 +1496,8 @@ def redact_by_text():
         })
         
     except Exception as e:
-        print(f"Error in text-based redaction: {str(e)}")
+        logger.error("Error in text-based redaction: %s", e)
         return jsonify({'error': f'Text-based redaction failed: {str(e)}'}), 500
-    """
-    API endpoint to extract all text fields from a document for manual selection.
-    This replaces the manual sketching approach with text-based field selection.
-    
-    Expected JSON input:
-    {
-        "file_id": "unique_file_id.ext",
-        "document_type": "aadhar|pan|passport|unknown",
-        "language": "eng|tam|hin|etc"
-    }
-    
-    Returns JSON with all detected text fields that users can select for redaction.
-    """
-    try:
-        data = request.json
-        file_id = data.get('file_id')
-        document_type = data.get('document_type', 'unknown')
-        language = data.get('language', 'eng')
-        
-        if not file_id:
-            return jsonify({'error': 'No file_id provided'}), 400
-        
-        file_path = os.path.join(UPLOAD_FOLDER, file_id)
-        if not os.path.exists(file_path):
-            return jsonify({'error': 'File not found'}), 404
-        
-        file_extension = os.path.splitext(file_id)[1].lower()
-        
-        # Extract text fields from the document
-        if file_extension == '.pdf':
-            text_fields = extract_from_pdf(file_path, language)
-        elif file_extension in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']:
-            text_fields = extract_from_image(file_path, language)
-        else:
-            return jsonify({'error': 'Unsupported file type'}), 400
-        
-        # Categorize fields by likely content type for better organization
-        categorized_fields = {
-            'names': [],
-            'numbers': [],
-            'addresses': [],
-            'dates': [],
-            'other': []
-        }
-        
-        for field in text_fields:
-            text = field.get('text', '').strip()
-            if not text:
-                continue
-                
-            # Simple categorization based on content
-            if re.search(r'\b\d{4}\s?\d{4}\s?\d{4}\b', text):  # Aadhar number pattern
-                field['suggested_category'] = 'ID Number'
-                categorized_fields['numbers'].append(field)
-            elif re.search(r'\b[A-Z]{5}\d{4}[A-Z]\b', text):  # PAN pattern
-                field['suggested_category'] = 'ID Number'
-                categorized_fields['numbers'].append(field)
-            elif re.search(r'\b\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}\b', text):  # Date pattern
-                field['suggested_category'] = 'Date'
-                categorized_fields['dates'].append(field)
-            elif re.search(r'\b[A-Z][a-z]+ [A-Z][a-z]+\b', text):  # Name pattern
-                field['suggested_category'] = 'Name'
-                categorized_fields['names'].append(field)
-            elif len(text) > 20 and (',' in text or 'road' in text.lower() or 'street' in text.lower()):  # Address pattern
-                field['suggested_category'] = 'Address'
-                categorized_fields['addresses'].append(field)
-            else:
-                field['suggested_category'] = 'Other'
-                categorized_fields['other'].append(field)
-        
-        return jsonify({
-            'file_id': file_id,
-            'document_type': document_type,
-            'language': language,
-            'total_fields': len(text_fields),
-            'categorized_fields': categorized_fields,
-            'all_fields': text_fields
-        })
-        
-    except Exception as e:
-        print(f"Error extracting text fields: {str(e)}")
-        return jsonify({'error': f'Text field extraction failed: {str(e)}'}), 500
 
 @app.route('/api/redact-selected-fields', methods=['POST'])
 def redact_selected_fields():
@@ -1135,14 +1561,14 @@ def redact_selected_fields():
         else:
             apply_image_redactions_text_based(file_path, output_path, redactions, document_type, language)
         
-        return jsonify({
+        return json_response({
             'redacted_file_id': f"redacted_{file_id}",
             'total_redactions': len(redactions),
             'redaction_method': 'text_based_selection'
         })
         
     except Exception as e:
-        print(f"Error in text-based redaction: {str(e)}")
+        logger.error("Error in text-based redaction: %s", e)
         return jsonify({'error': f'Text-based redaction failed: {str(e)}'}), 500
 
 @app.route('/api/analyze-document', methods=['POST'])
@@ -1175,21 +1601,23 @@ def analyze_document():
         doc_width = 800
         doc_height = 1100
         
-        # If data fields are provided, enhance them with AI analysis
-        if 'data_fields' in data and data['data_fields']:
-            data_fields = data['data_fields']
-            # Extract text from data fields for AI analysis
-            all_text = " ".join([field.get("text", "") for field in data_fields if field.get("text")])
-            
+        # Use the data fields provided; fall back to the ones recognized when the file was
+        # uploaded only if the request carries no text of its own
+        data_fields = data.get('data_fields')
+        if not data_fields and not data.get('extracted_text'):
+            data_fields = get_upload_fields(file_id)
+        
+        # If there are data fields, enhance them with AI analysis
+        if data_fields:
             # If we have text, use Gemini to analyze and enhance fields
-            if all_text:
+            if any(field.get("text") for field in data_fields):
                 # Use the enhanced_document_fields function from ai_analysis.py
                 enhanced_fields = enhance_document_fields(data_fields, "unknown")
                 
                 # Filter to only include fields identified as sensitive
                 sensitive_fields = [field for field in enhanced_fields if field.get('category') or field.get('ai_confidence')]
                 
-                return jsonify({
+                return json_response({
                     'original_fields': data_fields,
                     'sensitive_fields': sensitive_fields,
                     'analysis_type': 'gemini_ai'
@@ -1197,77 +1625,74 @@ def analyze_document():
             
         # If text is provided directly, use it
         elif 'extracted_text' in data and data['extracted_text']:
-            extracted_text = data['extracted_text']
+            page_texts = [data['extracted_text']]
             
         # Otherwise, extract text from the file
         else:
             file_extension = os.path.splitext(file_id)[1].lower()
             
             if file_extension == '.pdf':
-                # Extract text from PDF
-                extracted_text = ""
+                # Extract text from PDF, keeping each page separate
                 try:
-                    pdf_document = fitz.open(file_path)
-                    
-                    # Get document dimensions for coordinate mapping
-                    if pdf_document.page_count > 0:
-                        first_page = pdf_document.load_page(0)
-                        doc_width = first_page.rect.width
-                        doc_height = first_page.rect.height
+                    with open_cached_pdf(file_path) as pdf_document:
+                        page_count = pdf_document.page_count
+                        # Get document dimensions for coordinate mapping
+                        if page_count > 0:
+                            first_page = pdf_document.load_page(0)
+                            doc_width = first_page.rect.width
+                            doc_height = first_page.rect.height
                     
-                    # Process each page
-                    for page_num in range(pdf_document.page_count):
-                        page = pdf_document.load_page(page_num)
-                        extracted_text += page.get_text()
+                    # Process each page, in the worker processes for long documents
+                    page_texts = extract_pdf_texts(file_path, range(page_count))
                 except Exception as e:
-                    print(f"Error extracting text from PDF: {e}")
+                    logger.error("Error extracting text from PDF: %s", e)
                     return jsonify({'error': f'Failed to extract text from PDF: {str(e)}'}), 500
             else:
                 # Extract text from image
                 try:
-                    img = Image.open(file_path)
-                    extracted_text = pytesseract.image_to_string(img)
+                    # Decode straight to the grayscale Tesseract works on
+                    gray = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
+                    if gray is None:
+                        raise ValueError(f"Cannot read image: {file_id}")
+                    # Word data rather than plain text, so the OCR cache filled at upload is reused
+                    page_texts = [ocr_text_from_data(ocr_image_to_data(gray))]
                     
                     # Get document dimensions
-                    doc_width = img.width
-                    doc_height = img.height
+                    doc_height, doc_width = gray.shape
                 except Exception as e:
-                    print(f"Error extracting text from image: {e}")
+                    logger.error("Error extracting text from image: %s", e)
                     return jsonify({'error': f'Failed to extract text from image: {str(e)}'}), 500
         
-        # Use Gemini to analyze the text
-        sensitive_fields = analyze_document_text(extracted_text, "unknown")
+        # Use Gemini to analyze the text; pages are sent concurrently over the shared
+        # client, so a multi-page PDF takes about as long as its slowest page
+        pages = [(page_num, text) for page_num, text in enumerate(page_texts) if text.strip()]
+        page_results = analyze_documents_concurrently([(text, "unknown") for _, text in pages])
         
-        # Generate field IDs and add page number
+        sensitive_fields = []
+        for (page_num, _), fields in zip(pages, page_results):
+            for field in fields:
+                field['page'] = page_num
+                sensitive_fields.append(field)
+        
+        # Generate field IDs
         for i, field in enumerate(sensitive_fields):
-            field['id'] = f"ai-field-{i}-{uuid.uuid4()}"
-            field['page'] = 0  # Default to first page
+            field['id'] = f"ai-field-{i}-{new_field_id()}"
             field['method'] = 'select'
-            
-            # If we have position info from text analysis, map it to document coordinates
-            if 'position' in field:
-                field = map_coordinates(
-                    field['position'], 
-                    {'width': doc_width, 'height': doc_height}, 
-                    field
-                )
-            else:
-                # Create a default position if none exists
-                field['position'] = {
-                    'x': int(doc_width * 0.1),
-                    'y': int(doc_height * 0.1) + (i * 50),  # Stagger vertically
-                    'width': max(len(field.get('text', '')) * 8, 100),  # Width based on text length
-                    'height': 30
-                }
-        
-        return jsonify({
+        
+        # Map text positions from the analysis to document coordinates, and give fields
+        # without any position a default one
+        map_coordinates_batch(sensitive_fields, {'width': doc_width, 'height': doc_height})
+        
+        return json_response({
             'sensitive_fields': sensitive_fields,
             'analysis_type': 'gemini_ai'
         })
         
     except Exception as e:
-        print(f"Error in AI analysis: {str(e)}")
+        logger.error("Error in AI analysis: %s", e)
         return jsonify({'error': f'AI analysis failed: {str(e)}'}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000, host='0.0.0.0')
+    # Development server only; run under gunicorn in production (see gunicorn.conf.py).
+    # The debugger allows code execution from the browser, so it is opt-in.
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', port=5000, host='0.0.0.0', threaded=True)
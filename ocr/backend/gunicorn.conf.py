@@ -0,0 +1,26 @@
+# Production server settings: gunicorn -c gunicorn.conf.py app:app
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+
+# One process per core, each serving several requests on threads. OCR runs in Tesseract
+# subprocesses and the image work in C extensions that release the GIL, so a request
+# blocked on OCR no longer stalls the others.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Large scanned PDFs take a while to OCR
+timeout = 120
+
+# Each worker also has its own OCR thread pool and page rendering process pool, which
+# default to one slot per core. Split the cores between the workers instead, so that
+# together they do not start cores x workers Tesseract runs and render processes. Keep
+# each Tesseract run to one OpenMP thread for the same reason.
+_per_worker = max(1, multiprocessing.cpu_count() // workers)
+raw_env = [
+    "OMP_THREAD_LIMIT=1",
+    f"OCR_MAX_WORKERS={os.environ.get('OCR_MAX_WORKERS', _per_worker)}",
+    f"RENDER_MAX_WORKERS={os.environ.get('RENDER_MAX_WORKERS', _per_worker)}",
+]
@@ -0,0 +1,146 @@
+import os
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+# PyMuPDF cannot be used from several threads at once, so pages are rasterized in
+# worker processes that each open the document themselves. Workers are spawned rather
+# than forked because the Flask server and ai_analysis run background threads.
+RENDER_MAX_WORKERS = int(os.environ.get("RENDER_MAX_WORKERS", os.cpu_count() or 1))
+# Page count from which text extraction is also split across the workers
+TEXT_PARALLEL_MIN_PAGES = int(os.environ.get("TEXT_PARALLEL_MIN_PAGES", 32))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Return the shared worker pool, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=RENDER_MAX_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+# Parsed uploads kept open for read-only use (text extraction), so each request on the
+# same file does not parse it again. Upload names are unique and never rewritten, so
+# the path identifies the content. A document may only be used by one thread at a time.
+_PDF_CACHE_SIZE = 32
+_pdf_cache: "OrderedDict[str, Tuple[fitz.Document, threading.Lock]]" = OrderedDict()
+_pdf_cache_lock = threading.Lock()
+
+@contextmanager
+def open_cached_pdf(file_path: str) -> Iterator["fitz.Document"]:
+    """
+    Open a PDF for reading through the document cache, holding its lock while in use.
+
+    The document must not be modified or closed by the caller; redaction paths that
+    change the document open their own copy with fitz.open.
+    """
+    evicted = []
+    with _pdf_cache_lock:
+        entry = _pdf_cache.get(file_path)
+        if entry is None:
+            entry = (fitz.open(file_path), threading.Lock())
+            _pdf_cache[file_path] = entry
+            while len(_pdf_cache) > _PDF_CACHE_SIZE:
+                evicted.append(_pdf_cache.popitem(last=False)[1])
+        else:
+            _pdf_cache.move_to_end(file_path)
+    # Close evicted documents outside the cache lock, once their current user is done
+    for pdf_document, lock in evicted:
+        with lock:
+            pdf_document.close()
+
+    pdf_document, lock = entry
+    with lock:
+        yield pdf_document
+
+def _render_pages(pdf_document: "fitz.Document", page_numbers: Sequence[int], zoom: float,
+                  gray: bool) -> List["fitz.Pixmap"]:
+    matrix = fitz.Matrix(zoom, zoom)
+    colorspace = fitz.csGRAY if gray else fitz.csRGB
+    return [pdf_document.load_page(page_num).get_pixmap(matrix=matrix, colorspace=colorspace, alpha=False)
+            for page_num in page_numbers]
+
+def _render_in_worker(file_path: str, page_numbers: Sequence[int], zoom: float,
+                      gray: bool) -> List[Tuple[int, int, bytes]]:
+    """Render pages of a PDF in a worker process, as (width, height, samples)."""
+    with fitz.open(file_path) as pdf_document:
+        return [(pix.width, pix.height, pix.samples)
+                for pix in _render_pages(pdf_document, page_numbers, zoom, gray)]
+
+def _map_in_workers(worker, file_path: str, page_numbers: List[int], *args) -> Optional[list]:
+    """
+    Run worker(file_path, chunk, *args) over one contiguous run of pages per worker
+    process, returning the concatenated results in page_numbers order, or None if the
+    pool failed and the caller should do the work in this process instead.
+    """
+    global _executor
+    chunk_size = -(-len(page_numbers) // RENDER_MAX_WORKERS)
+    chunks = [page_numbers[i:i + chunk_size] for i in range(0, len(page_numbers), chunk_size)]
+    executor = _get_executor()
+    try:
+        n_chunks = len(chunks)
+        results = executor.map(worker, [file_path] * n_chunks, chunks, *([arg] * n_chunks for arg in args))
+        return [item for chunk_result in results for item in chunk_result]
+    except BrokenProcessPool as e:
+        # A worker died (or could not start); drop the pool so the next call starts a new one
+        logger.warning("PDF workers failed (%s), working in-process", e)
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        return None
+
+def render_pdf_pages(file_path: str, page_numbers: Sequence[int], zoom: float = 1.0,
+                     gray: bool = False) -> List["fitz.Pixmap"]:
+    """
+    Render the given pages of a PDF file to pixmaps, in page_numbers order.
+
+    Pages are rendered at zoom times 72 DPI, as RGB or, with gray, as single-channel
+    grayscale (a third of the memory, and all Tesseract needs). Several pages are split
+    into one contiguous run per worker and rendered in parallel; a single page, or a
+    single-core machine, is rendered in this process.
+    """
+    page_numbers = list(page_numbers)
+    if len(page_numbers) >= 2 and RENDER_MAX_WORKERS >= 2:
+        rendered = _map_in_workers(_render_in_worker, file_path, page_numbers, zoom, gray)
+        if rendered is not None:
+            colorspace = fitz.csGRAY if gray else fitz.csRGB
+            return [fitz.Pixmap(colorspace, width, height, samples, False)
+                    for width, height, samples in rendered]
+
+    with fitz.open(file_path) as pdf_document:
+        return _render_pages(pdf_document, page_numbers, zoom, gray)
+
+def _text_in_worker(file_path: str, page_numbers: Sequence[int]) -> List[str]:
+    """Extract the text of pages of a PDF in a worker process."""
+    with fitz.open(file_path) as pdf_document:
+        return [pdf_document.load_page(page_num).get_text() for page_num in page_numbers]
+
+def extract_pdf_texts(file_path: str, page_numbers: Sequence[int]) -> List[str]:
+    """
+    Extract the plain text of the given pages of a PDF file, in page_numbers order.
+
+    Text extraction is cheap per page, so only documents of at least
+    TEXT_PARALLEL_MIN_PAGES pages are split across the worker processes, where it
+    outweighs each worker parsing the file; shorter ones are read from the document
+    cache in this process.
+    """
+    page_numbers = list(page_numbers)
+    if len(page_numbers) >= TEXT_PARALLEL_MIN_PAGES and RENDER_MAX_WORKERS >= 2:
+        texts = _map_in_workers(_text_in_worker, file_path, page_numbers)
+        if texts is not None:
+            return texts
+
+    with open_cached_pdf(file_path) as pdf_document:
+        return [pdf_document.load_page(page_num).get_text() for page_num in page_numbers]
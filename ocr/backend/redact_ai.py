@@ -3,6 +3,12 @@ import re
 import math
 from typing import List, Tuple, Dict, Any
 import sys
+import os
+import queue
+import threading
+import hashlib
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 import logging
 
@@ -23,6 +29,23 @@ except ImportError:
     logger.error("Required libraries (pytesseract, OpenCV, Pillow, numpy) not found. Please install them.")
     sys.exit(1)
 
+# Optional in-process Tesseract binding: keeps the engine and language data loaded
+# between calls instead of starting a tesseract process for every image
+try:
+    import tesserocr
+    HAS_TESSEROCR = True
+except ImportError:
+    HAS_TESSEROCR = False
+
+# Set OCR_ENGINE=pytesseract to use the tesseract command line even when tesserocr is installed
+USE_TESSEROCR = HAS_TESSEROCR and os.environ.get("OCR_ENGINE", "").lower() != "pytesseract"
+
+# Optional on-disk cache of OCR results shared across restarts
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
 # --- Global Configurations ---
 TEMPLATES = {
     "aadhaar": {
@@ -119,6 +142,7 @@ LANGUAGE_CONFIGS = {
 AADHAAR_RE = re.compile(r"\b\d{4}\s?\d{4}\s?\d{4}\b")
 PAN_RE = re.compile(r"\b[A-Z]{5}\d{4}[A-Z]\b")
 DATE_RE = re.compile(r"\b(?:\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}|(?:\d{4}[-/\.]\d{1,2}[-/\.]\d{1,2}))\b")
+FOUR_DIGITS_RE = re.compile(r"\d{4}")
 # Default English keywords for backward compatibility
 NAME_KWS = LANGUAGE_CONFIGS["eng"]["name_keywords"]
 REGISTER_KWS = LANGUAGE_CONFIGS["eng"]["register_keywords"]
@@ -159,11 +183,16 @@ def _auto_rotate(gray: np.ndarray) -> np.ndarray:
     M = cv2.getRotationMatrix2D((w//2, h//2), median_angle, 1.0)
     return cv2.warpAffine(gray, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
 
-def preprocess_image_for_ocr(image_path: str, debug: bool = False) -> Tuple[np.ndarray, np.ndarray]:
-    """Returns (original_color_bgr, processed_gray_for_ocr)"""
-    orig = cv2.imread(image_path, cv2.IMREAD_COLOR)
-    if orig is None:
-        raise FileNotFoundError(f"Cannot read image: {image_path}")
+def preprocess_image_for_ocr(image_path: str = None, debug: bool = False,
+                             image: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (original_color_bgr, processed_gray_for_ocr) for an image file or a BGR array"""
+    if image is not None:
+        # Redactions are drawn on the returned image, so never on the caller's array
+        orig = image.copy()
+    else:
+        orig = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if orig is None:
+            raise FileNotFoundError(f"Cannot read image: {image_path}")
     
     scale = 1.5 if max(orig.shape[:2]) < 1600 else 1.0
     if scale != 1.0:
@@ -190,11 +219,140 @@ def preprocess_image_for_ocr(image_path: str, debug: bool = False) -> Tuple[np.n
     return orig, proc
 
 # --- OCR & Detection Functions ---
-def _ocr_with_boxes(img_gray_or_bin: np.ndarray, lang: str) -> Dict[str, List[Any]]:
-    config = "--oem 3 --psm 6"
-    data = pytesseract.image_to_data(img_gray_or_bin, lang=lang, config=config, output_type=Output.DICT)
+# Idle tesserocr engines per language. An engine is not thread-safe, so each call takes
+# one from the pool (creating it if none is idle) and returns it when done.
+_tess_api_pools: Dict[str, "queue.SimpleQueue"] = {}
+_tess_api_pools_lock = threading.Lock()
+
+@contextmanager
+def _tess_api(lang: str):
+    with _tess_api_pools_lock:
+        pool = _tess_api_pools.setdefault(lang, queue.SimpleQueue())
+    try:
+        api = pool.get_nowait()
+    except queue.Empty:
+        api = tesserocr.PyTessBaseAPI(lang=lang, oem=tesserocr.OEM.DEFAULT)
+    try:
+        yield api
+    finally:
+        api.Clear()
+        pool.put(api)
+
+def _to_pil(image) -> "Image.Image":
+    return image if isinstance(image, Image.Image) else Image.fromarray(image)
+
+# Cache of OCR results keyed by a hash of the image pixels, language and segmentation
+# mode, so re-uploaded files and repeated pages are not recognized again
+_OCR_CACHE_SIZE = 256
+_ocr_cache: "OrderedDict[str, Any]" = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+# The recognized text is the document's sensitive content, so keeping it on disk across
+# restarts is opt-in: set OCR_CACHE_DIR to enable it (requires the diskcache package)
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR")
+
+def _open_ocr_disk_cache():
+    if not OCR_CACHE_DIR:
+        return None
+    if diskcache is None:
+        logger.warning("OCR_CACHE_DIR is set but the diskcache package is not installed")
+        return None
+    try:
+        return diskcache.Cache(OCR_CACHE_DIR)
+    except OSError as e:
+        logger.warning("Could not open the OCR disk cache at %s: %s", OCR_CACHE_DIR, e)
+        return None
+
+_ocr_disk_cache = _open_ocr_disk_cache()
+
+def _ocr_cache_key(kind: str, image, lang: str, psm: int) -> str:
+    if isinstance(image, Image.Image):
+        shape, pixels = f"{image.mode}{image.size}", image.tobytes()
+    else:
+        pixels = np.ascontiguousarray(image)
+        shape = f"{pixels.dtype}{pixels.shape}"
+    engine = "tesserocr" if USE_TESSEROCR else "tesseract"
+    digest = hashlib.blake2b(f"{kind}|{engine}|{lang}|{psm}|{shape}|".encode("utf-8"), digest_size=16)
+    digest.update(pixels)
+    return digest.hexdigest()
+
+def _ocr_cache_get(key: str):
+    with _ocr_cache_lock:
+        result = _ocr_cache.get(key)
+        if result is not None:
+            _ocr_cache.move_to_end(key)
+    if result is None and _ocr_disk_cache is not None:
+        result = _ocr_disk_cache.get(key)
+        if result is not None:
+            _ocr_cache_put(key, result, persist=False)
+    return result
+
+def _ocr_cache_put(key: str, result, persist: bool = True) -> None:
+    with _ocr_cache_lock:
+        _ocr_cache[key] = result
+        _ocr_cache.move_to_end(key)
+        while len(_ocr_cache) > _OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+    if persist and _ocr_disk_cache is not None:
+        _ocr_disk_cache.set(key, result)
+
+def get_cached_ocr_data(image, lang: str = "eng", psm: int = 3):
+    """Return the cached ocr_image_to_data result for an image, or None if it was not recognized yet."""
+    data = _ocr_cache_get(_ocr_cache_key("data", image, lang, psm))
+    # Callers may extend the lists, so never hand out the cached ones
+    return {key: list(values) for key, values in data.items()} if data is not None else None
+
+def cache_ocr_data(image, data: Dict[str, List[Any]], lang: str = "eng", psm: int = 3) -> None:
+    """Store an image's OCR word boxes recognized outside ocr_image_to_data (e.g. in a batch run)."""
+    _ocr_cache_put(_ocr_cache_key("data", image, lang, psm), {key: list(values) for key, values in data.items()})
+
+def ocr_image_to_data(image, lang: str = "eng", psm: int = 3) -> Dict[str, List[Any]]:
+    """OCR an image into word boxes, laid out like pytesseract's image_to_data Output.DICT."""
+    data = get_cached_ocr_data(image, lang, psm)
+    if data is None:
+        data = _recognize_data(image, lang, psm)
+        cache_ocr_data(image, data, lang, psm)
     return data
 
+def _recognize_data(image, lang: str, psm: int) -> Dict[str, List[Any]]:
+    if not USE_TESSEROCR:
+        return pytesseract.image_to_data(image, lang=lang, config=f"--oem 3 --psm {psm}", output_type=Output.DICT)
+    
+    data = {key: [] for key in ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+                                "left", "top", "width", "height", "conf", "text")}
+    with _tess_api(lang) as api:
+        api.SetPageSegMode(psm)
+        api.SetImage(_to_pil(image))
+        api.Recognize()
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+        
+        # Number blocks, paragraphs, lines and words the way tesseract's TSV output does
+        block = par = line = word = 0
+        level = tesserocr.RIL.WORD
+        for r in tesserocr.iterate_level(iterator, level):
+            box = r.BoundingBox(level)
+            if box is None:
+                continue
+            if r.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                block, par = block + 1, 0
+            if r.IsAtBeginningOf(tesserocr.RIL.PARA):
+                par, line = par + 1, 0
+            if r.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                line, word = line + 1, 0
+            word += 1
+            x1, y1, x2, y2 = box
+            for key, value in (("level", 5), ("page_num", 1), ("block_num", block), ("par_num", par),
+                               ("line_num", line), ("word_num", word), ("left", x1), ("top", y1),
+                               ("width", x2 - x1), ("height", y2 - y1), ("conf", r.Confidence(level)),
+                               ("text", r.GetUTF8Text(level) or "")):
+                data[key].append(value)
+    return data
+
+def _ocr_with_boxes(img_gray_or_bin: np.ndarray, lang: str) -> Dict[str, List[Any]]:
+    return ocr_image_to_data(img_gray_or_bin, lang=lang, psm=6)
+
 def _merge_boxes(boxes: List[Tuple[int, int, int, int]]) -> Tuple[int, int, int, int]:
     if not boxes:
         return (0, 0, 0, 0)
@@ -221,7 +379,7 @@ def detect_entities_from_ocr(data: Dict[str, List[Any]], requested_fields: set,
     # Fallback to English if language not in our configs
     if primary_lang not in LANGUAGE_CONFIGS:
         if debug:
-            print(f"[DEBUG] Language '{primary_lang}' not in configs, using English as fallback")
+            logger.debug("Language '%s' not in configs, using English as fallback", primary_lang)
         primary_lang = "eng"
         
     name_keywords = LANGUAGE_CONFIGS[primary_lang]["name_keywords"]
@@ -229,8 +387,10 @@ def detect_entities_from_ocr(data: Dict[str, List[Any]], requested_fields: set,
     register_keywords = LANGUAGE_CONFIGS[primary_lang]["register_keywords"]
     
     if debug:
-        print(f"[DEBUG] Using language: {primary_lang}")
-        print(f"[DEBUG] Name keywords: {name_keywords}")
+        logger.debug("Using language: %s", primary_lang)
+        logger.debug("Name keywords: %s", name_keywords)
+    
+    lowered = [w.lower() for w in words]
     
     # Pass 1: regex matches
     full_text = " ".join(words)
@@ -277,7 +437,7 @@ def detect_entities_from_ocr(data: Dict[str, List[Any]], requested_fields: set,
                 if idxs:
                     # Look for digit patterns in those words
                     id_text = "".join([data['text'][j] for j in idxs])
-                    if re.search(r'\d{4}', id_text):  # Even partial match is worth checking
+                    if FOUR_DIGITS_RE.search(id_text):  # Even partial match is worth checking
                         boxes = [(data['left'][j], data['top'][j], data['width'][j], data['height'][j]) for j in idxs]
                         hits["aadhaar_number"].append(_merge_boxes(boxes))
 
@@ -310,8 +470,6 @@ def detect_entities_from_ocr(data: Dict[str, List[Any]], requested_fields: set,
                 hits["dob"].append(_merge_boxes(boxes))
 
     # Pass 2: keyword spans
-    lowered = [(w or "").strip().lower() for w in data['text']]
-    
     # Detect names
     if "name" in requested_fields:
         for i, w in enumerate(lowered):
@@ -360,9 +518,8 @@ def detect_entities_from_ocr(data: Dict[str, List[Any]], requested_fields: set,
         hits[k] = uniq
     
     if debug:
-        print("[DEBUG] Detected fields:")
-        for field, boxes in hits.items():
-            print(f"  {field}: {len(boxes)} boxes found")
+        logger.debug("Detected fields: %s",
+                     ", ".join(f"{field}: {len(boxes)} boxes" for field, boxes in hits.items()))
     
     return hits
 
@@ -388,13 +545,15 @@ def draw_redactions(color_bgr: np.ndarray, boxes: List[Tuple[int, int, int, int]
             cv2.rectangle(color_bgr, (x, y), (x + w, y + h), (0, 0, 0), thickness=-1)
 
 # --- Main Redaction Function ---
-def redact_image(image_path: str, doc_type: str = "unknown",
+def redact_image(image_path: str = None, doc_type: str = "unknown",
                  permanent_fields: List[str] = None, temporary_fields: List[str] = None,
-                 lang: str = "eng", debug: bool = False, style: str = "black") -> Image.Image:
+                 lang: str = "eng", debug: bool = False, style: str = "black",
+                 image: np.ndarray = None) -> Image.Image:
+    """Redact an image file, or an in-memory BGR array passed as image."""
     if permanent_fields is None: permanent_fields = []
     if temporary_fields is None: temporary_fields = []
     
-    color_bgr, ocr_img = preprocess_image_for_ocr(image_path, debug=debug)
+    color_bgr, ocr_img = preprocess_image_for_ocr(image_path, debug=debug, image=image)
     h, w = color_bgr.shape[:2]
     req_fields = set([f.lower() for f in (permanent_fields + temporary_fields)])
     
@@ -410,9 +569,9 @@ def redact_image(image_path: str, doc_type: str = "unknown",
     data = _ocr_with_boxes(ocr_img, lang=lang)
     if debug:
         extracted = " ".join([t for t in data['text'] if t and t.strip()])
-        print(f"\n[DEBUG] Raw Extracted Text ({lang}):\n", extracted, "\n")
-        print(f"[DEBUG] Document type: {doc_type_normalized}")
-        print(f"[DEBUG] Requested fields: {req_fields}")
+        logger.debug("Raw extracted text (%s):\n%s", lang, extracted)
+        logger.debug("Document type: %s", doc_type_normalized)
+        logger.debug("Requested fields: %s", req_fields)
     
     boxes_by_field = detect_entities_from_ocr(data, req_fields, debug=debug, lang=lang)
     
@@ -424,7 +583,7 @@ def redact_image(image_path: str, doc_type: str = "unknown",
             draw_redactions(color_bgr, boxes, style=redaction_style)
             fields_redacted.add(field)
             if debug:
-                print(f"[DEBUG] Applied OCR-detected redactions for {field}")
+                logger.debug("Applied OCR-detected redactions for %s", field)
     
     # Fall back to template coordinates for fields that weren't detected
     if doc_type_normalized in TEMPLATES:
@@ -439,7 +598,7 @@ def redact_image(image_path: str, doc_type: str = "unknown",
                 redaction_style = "black" if f in permanent_fields else "yellow"
                 draw_redactions(color_bgr, [(x, y, width, height)], style=redaction_style)
                 if debug:
-                    print(f"[DEBUG] Applied template-based redactions for {f}")
+                    logger.debug("Applied template-based redactions for %s", f)
     
     # Special case for Aadhar cards - make sure aadhaar_number is always redacted
     # This is a fallback in case both OCR and template failed
@@ -449,7 +608,7 @@ def redact_image(image_path: str, doc_type: str = "unknown",
         redaction_style = "black" if 'aadhaar_number' in permanent_fields else "yellow"
         draw_redactions(color_bgr, [(int(w * 0.1), center_y, int(w * 0.8), int(h * 0.08))], style=redaction_style)
         if debug:
-            print(f"[DEBUG] Applied fallback redaction for aadhaar_number")
+            logger.debug("Applied fallback redaction for aadhaar_number")
 
     return Image.fromarray(cv2.cvtColor(color_bgr, cv2.COLOR_BGR2RGB))
 
@@ -501,6 +660,8 @@ if __name__ == "__main__":
     parser.add_argument("--debug", action="store_true", help="Print OCR text and save debug image")
 
     args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
     
     try:
         img = redact_image(
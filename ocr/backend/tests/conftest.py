@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules are imported by name, as app.py imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run a test in an empty directory with the upload folders app.py expects."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "processed").mkdir()
+    (tmp_path / "upload_status").mkdir()
+    return tmp_path
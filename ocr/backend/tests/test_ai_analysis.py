@@ -0,0 +1,133 @@
+import json
+
+import httpx
+import pytest
+
+import ai_analysis
+
+
+def fields_of(text):
+    return [(field["text"], field["category"], field["position"]["start"], field["position"]["end"])
+            for field in ai_analysis.analyze_with_regex(text)]
+
+
+# Outputs of the original one-search-per-pattern regex fallback
+@pytest.mark.parametrize("text, expected", [
+    ("Flat No. 5 Main Road Bangalore 560001", [
+        ("Flat No", "Name", 0, 7),
+        ("Main Road", "Name", 11, 20),
+        ("No. 5 Main Road", "Address", 5, 20),
+    ]),
+    ("Call 1234 5678 9012 3456", [
+        ("1234 5678 9012", "ID_Number", 5, 19),
+        ("1234 5678", "Phone", 5, 14),
+        ("9012 3456", "Phone", 15, 24),
+    ]),
+    ("S/o Ramesh Kumar, Father: Suresh Babu, UID 123456789012 Born on 1990-05-12 "
+     "Residence: 45 Lake View Street Chennai", [
+        ("Ramesh Kumar", "Name", 4, 16),
+        ("Suresh Babu", "Name", 26, 37),
+        ("Lake View", "Name", 89, 98),
+        ("Street Chennai", "Name", 99, 113),
+        ("123456789012", "ID_Number", 43, 55),
+        ("1990-05-12", "DOB", 64, 74),
+        ("45 Lake View Street Chennai", "Address", 86, 113),
+    ]),
+])
+def test_regex_fallback_matches_overlapping_patterns(text, expected):
+    assert fields_of(text) == expected
+
+
+def test_regex_fallback_reads_labelled_values():
+    text = "Name: Ravi Kumar\nDOB: 12/05/1990\nEmail ravi.k@gmail.com PAN ABCDE1234F"
+    found = {(text, category) for text, category, _, _ in fields_of(text)}
+    assert {("Ravi Kumar", "Name"), ("12/05/1990", "DOB"), ("ravi.k@gmail.com", "Email"),
+            ("ABCDE1234F", "ID_Number")} <= found
+
+
+class ChunkedStream(httpx.AsyncByteStream):
+    """A response body delivered in the given pieces, like a network stream."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def sse_body(reply_text, pieces=2):
+    """Stream a Gemini reply as server-sent events, with the reply text and the bytes split up."""
+    size = -(-len(reply_text) // pieces)
+    events = b"".join(
+        b"data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": reply_text[i:i + size]}]}}]}).encode()
+        + b"\r\n\r\n"
+        for i in range(0, len(reply_text), size))
+    return [events[i:i + 7] for i in range(0, len(events), 7)]
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Route Gemini requests to a handler set by the test; records the requests made."""
+    requests = []
+    state = {"handler": None}
+
+    def handle(request):
+        requests.append(request)
+        return state["handler"](request)
+
+    monkeypatch.setattr(ai_analysis, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(ai_analysis, "PREFER_REGEX_FAST_PATH", False)
+    monkeypatch.setattr(ai_analysis, "_get_client",
+                        lambda: httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    state["requests"] = requests
+    return state
+
+
+def test_gemini_streamed_reply_is_parsed(gemini):
+    reply = [{"text": "Ravi Kumar", "category": "Name", "confidence": 95}]
+    gemini["handler"] = lambda request: httpx.Response(200, stream=ChunkedStream(sse_body(json.dumps(reply))))
+
+    fields = ai_analysis.analyze_document_text("Name: Ravi Kumar", use_cache=False)
+
+    assert fields == reply
+    request = gemini["requests"][0]
+    assert request.url.params["alt"] == "sse"
+    assert request.headers["X-goog-api-key"] == "test-key"
+    body = json.loads(request.content)
+    assert "Name: Ravi Kumar" in body["contents"][0]["parts"][0]["text"]
+
+
+def test_gemini_batch_reply_is_split_per_document(gemini):
+    reply = [{"doc": 1, "fields": [{"text": "9876543210", "category": "Phone", "confidence": 90}]},
+             {"doc": 0, "fields": [{"text": "Ravi Kumar", "category": "Name", "confidence": 95}]}]
+    # A fenced reply is still found
+    reply_text = "```json\n" + json.dumps(reply) + "\n```"
+    gemini["handler"] = lambda request: httpx.Response(200, stream=ChunkedStream(sse_body(reply_text, pieces=3)))
+
+    results = ai_analysis.analyze_documents_batch(["Ravi Kumar", "Call 9876543210"], use_cache=False)
+
+    assert [[field["text"] for field in fields] for fields in results] == [["Ravi Kumar"], ["9876543210"]]
+    assert len(gemini["requests"]) == 1
+
+
+def test_gemini_error_falls_back_to_regex(gemini):
+    gemini["handler"] = lambda request: httpx.Response(500, text="internal error")
+
+    text = "Call 1234 5678 9012 3456"
+    fields = ai_analysis.analyze_document_text(text, use_cache=False)
+
+    assert fields == ai_analysis.analyze_with_regex(text)
+
+
+def test_regex_fast_path_keeps_every_regex_field(gemini, monkeypatch):
+    monkeypatch.setattr(ai_analysis, "PREFER_REGEX_FAST_PATH", True)
+    gemini["handler"] = lambda request: httpx.Response(500)
+    text = ("Name: Ravi Kumar\nDOB: 12/05/1990\nAadhaar: 1234 5678 9012\nPhone: +91 98765 43210\n"
+            "Address: No. 12, MG Road, Bengaluru 560001\nEmail ravi.k@gmail.com PAN ABCDE1234F")
+
+    fields = ai_analysis.analyze_document_text(text, use_cache=False)
+
+    assert not gemini["requests"]
+    assert fields == ai_analysis.analyze_with_regex(text)
+    assert min(field["confidence"] for field in fields) < ai_analysis.REGEX_FAST_PATH_MIN_CONFIDENCE
@@ -0,0 +1,241 @@
+import io
+import time
+
+import fitz
+import numpy as np
+import pytest
+
+import app as backend
+
+
+def make_pdf(path, lines, image_rect=None):
+    """Write a one-page PDF with a line of text per entry and optionally a gray image."""
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, line in enumerate(lines):
+        page.insert_text((72, 72 + 30 * i), line, fontsize=14)
+    if image_rect is not None:
+        pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 100, 100), False)
+        pix.clear_with(128)
+        page.insert_image(fitz.Rect(image_rect), pixmap=pix)
+    doc.save(str(path))
+    doc.close()
+
+
+def page_text(path):
+    with fitz.open(str(path)) as doc:
+        return doc[0].get_text()
+
+
+def test_permanent_text_redaction_removes_only_the_matched_text(workdir):
+    make_pdf(workdir / "in.pdf", ["Account: ACC123456789 end", "Name: Ravikumar Singh here"])
+
+    count = backend.apply_pdf_text_redactions(
+        str(workdir / "in.pdf"), str(workdir / "out.pdf"),
+        [{"text": "123456", "redaction_type": "permanent"},
+         {"text": "kumar Singh", "redaction_type": "permanent"}])
+
+    text = page_text(workdir / "out.pdf")
+    assert count == 2
+    assert "123456" not in text and "kumar" not in text and "Singh" not in text
+    # Clipped to the match: the rest of the partly matched words stays
+    assert "AC" in text and "Rav" in text and "here" in text
+
+
+def test_temporary_text_redaction_keeps_the_text(workdir):
+    make_pdf(workdir / "in.pdf", ["Phone 9876543210"])
+
+    backend.apply_pdf_text_redactions(str(workdir / "in.pdf"), str(workdir / "out.pdf"),
+                                      [{"text": "9876543210", "redaction_type": "temporary"}])
+
+    assert "9876543210" in page_text(workdir / "out.pdf")
+
+
+def test_failed_text_redaction_writes_no_output(workdir, monkeypatch):
+    make_pdf(workdir / "in.pdf", ["Phone 9876543210"])
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("apply failed")
+    monkeypatch.setattr(fitz.Page, "apply_redactions", fail)
+
+    with pytest.raises(RuntimeError):
+        backend.apply_pdf_text_redactions(str(workdir / "in.pdf"), str(workdir / "out.pdf"),
+                                          [{"text": "9876543210", "redaction_type": "permanent"}])
+    assert not (workdir / "out.pdf").exists()
+
+
+def test_permanent_box_redaction_removes_text_and_image_pixels(workdir):
+    make_pdf(workdir / "in.pdf", ["Secret 1234"], image_rect=(300, 300, 400, 400))
+
+    # Cover the text and the left half of the image
+    backend.apply_pdf_redactions(
+        str(workdir / "in.pdf"), str(workdir / "out.pdf"),
+        [{"page": 0, "redaction_type": "permanent", "position": {"x": 60, "y": 50, "width": 120, "height": 30}},
+         {"page": 0, "redaction_type": "permanent", "position": {"x": 300, "y": 300, "width": 50, "height": 100}}],
+        'permanent')
+
+    with fitz.open(str(workdir / "out.pdf")) as doc:
+        page = doc[0]
+        assert "Secret" not in page.get_text()
+        xref = page.get_images()[0][0]
+        pix = fitz.Pixmap(doc, xref)
+        assert pix.pixel(10, 50) != (128, 128, 128)
+        assert pix.pixel(90, 50) == (128, 128, 128)
+
+
+def test_text_layer_redaction_leaves_pages_with_images_to_the_raster_path():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Aadhaar 1234 5678 9012")
+    assert backend.redact_pdf_page_text(page, 'aadhaar', ['aadhaar_number'], 'permanent')
+    assert "1234" not in page.get_text()
+
+    image_page = doc.new_page()
+    image_page.insert_text((72, 72), "Aadhaar 1234 5678 9012")
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    image_page.insert_image(fitz.Rect(200, 200, 260, 260), pixmap=pix)
+    assert not backend.redact_pdf_page_text(image_page, 'aadhaar', ['aadhaar_number'], 'permanent')
+    assert "1234" in image_page.get_text()
+
+
+def wait_for_status(client, file_id):
+    for _ in range(100):
+        response = client.get(f'/api/status/{file_id}')
+        if response.status_code != 202:
+            return response
+        time.sleep(0.05)
+    return response
+
+
+def pdf_bytes(lines):
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, line in enumerate(lines):
+        page.insert_text((72, 72 + 30 * i), line)
+    return doc.tobytes()
+
+
+def test_async_upload_status_survives_another_process(workdir, monkeypatch):
+    client = backend.app.test_client()
+    # Process the job without filling this process's memory, as if another worker ran it
+    monkeypatch.setattr(backend, "cache_upload_fields", lambda file_id, data_fields: None)
+    response = client.post('/api/upload', data={
+        'file': (io.BytesIO(pdf_bytes(["Name: Ravi Kumar"])), 'doc.pdf'), 'async': '1'})
+    assert response.status_code == 202
+    file_id = response.get_json()['file_id']
+
+    response = wait_for_status(client, file_id)
+    assert response.status_code == 200
+    assert [field['text'] for field in response.get_json()['data_fields']] == ["Name:", "Ravi", "Kumar"]
+
+    # Once collected, the fields are no longer kept on disk
+    assert backend.load_upload_status(file_id) == {'status': 'collected'}
+    assert client.get(f'/api/status/{file_id}').status_code == 410
+
+    assert client.get('/api/status/unknown.pdf').status_code == 404
+
+
+def test_collected_upload_fields_stay_in_memory(workdir):
+    client = backend.app.test_client()
+    response = client.post('/api/upload', data={
+        'file': (io.BytesIO(pdf_bytes(["Name: Ravi Kumar"])), 'doc.pdf'), 'async': '1'})
+    file_id = response.get_json()['file_id']
+
+    assert wait_for_status(client, file_id).status_code == 200
+    response = client.get(f'/api/status/{file_id}')
+    assert response.status_code == 200
+    assert len(response.get_json()['data_fields']) == 3
+
+
+def test_sync_upload_writes_no_fields_to_disk(workdir):
+    client = backend.app.test_client()
+    response = client.post('/api/upload', data={
+        'file': (io.BytesIO(pdf_bytes(["Name: Ravi Kumar"])), 'doc.pdf')})
+
+    assert len(response.get_json()['data_fields']) == 3
+    assert not list((workdir / "upload_status").iterdir())
+    assert [path.name for path in (workdir / "processed").iterdir()] == []
+
+
+def test_async_upload_failure_is_reported(workdir, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(backend, "process_upload", fail)
+    client = backend.app.test_client()
+    response = client.post('/api/upload', data={
+        'file': (io.BytesIO(pdf_bytes(["x"])), 'doc.pdf'), 'async': '1'})
+
+    response = wait_for_status(client, response.get_json()['file_id'])
+    assert response.status_code == 500
+    assert response.get_json()['error'] == 'Processing failed: disk full'
+
+
+def test_analyze_document_prefers_the_extracted_text_sent(workdir, monkeypatch):
+    monkeypatch.setattr("ai_analysis.GEMINI_API_KEY", None)
+    client = backend.app.test_client()
+    response = client.post('/api/upload', data={
+        'file': (io.BytesIO(pdf_bytes(["Name: Ravi Kumar"])), 'doc.pdf')})
+    file_id = response.get_json()['file_id']
+
+    response = client.post('/api/analyze-document',
+                           json={'file_id': file_id, 'extracted_text': "Call 9876543210"})
+
+    assert [field['text'] for field in response.get_json()['sensitive_fields']] == ["9876543210"]
+
+
+def test_failed_field_redaction_writes_no_output(workdir):
+    make_pdf(workdir / "uploads" / "doc.pdf", ["Secret 1234 Aadhaar"])
+    client = backend.app.test_client()
+
+    response = client.post('/api/redact-selected-fields', json={'file_id': 'doc.pdf', 'selected_fields': [
+        {'text': 'Secret', 'redaction_type': 'permanent', 'page': 0,
+         'position': {'x': 60, 'y': 50, 'width': 60, 'height': 30}},
+        {'text': '1234', 'redaction_type': 'permanent', 'page': 0,
+         'position': {'x': None, 'y': 50, 'width': 40, 'height': 30}}]})
+
+    assert response.status_code == 500
+    assert not (workdir / "processed" / "redacted_doc.pdf").exists()
+
+
+def test_failed_text_redaction_is_reported_as_json(workdir, monkeypatch):
+    make_pdf(workdir / "uploads" / "doc.pdf", ["Phone 9876543210"])
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("apply failed")
+    monkeypatch.setattr(fitz.Page, "apply_redactions", fail)
+    client = backend.app.test_client()
+
+    response = client.post('/api/redact', json={'file_id': 'doc.pdf', 'text_to_redact': [
+        {'text': '9876543210', 'redaction_type': 'permanent'}]})
+
+    assert response.status_code == 500
+    assert response.get_json() == {'error': 'Text-based redaction failed: apply failed'}
+    assert not (workdir / "processed" / "redacted_doc.pdf").exists()
+
+
+def ocr_data(words):
+    """image_to_data output with a layout row, then one word row per (text, conf)."""
+    rows = [("", -1)] + list(words)
+    return {'text': [text for text, _ in rows], 'conf': [conf for _, conf in rows],
+            'block_num': [1] * len(rows), 'par_num': [1] * len(rows), 'line_num': [1] * len(rows),
+            'left': [0] * len(rows), 'top': [0] * len(rows), 'width': [5] * len(rows), 'height': [5] * len(rows)}
+
+
+def test_scanned_pdf_retries_only_low_confidence_pages_with_words(workdir, monkeypatch):
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page()
+    doc.save(str(workdir / "scan.pdf"))
+    first_pass = {0: ocr_data([]), 1: ocr_data([("Ravi", 30)]), 2: ocr_data([("Kumar", 90)])}
+    calls = []
+
+    def fake_ocr(file_path, page_numbers, zoom, language='eng'):
+        calls.append((list(page_numbers), zoom))
+        data = first_pass if zoom == backend.OCR_RENDER_ZOOM else {1: ocr_data([("Ravi", 80)])}
+        return [(n, np.zeros((10, 10), dtype=np.uint8), data[n]) for n in page_numbers]
+    monkeypatch.setattr(backend, "ocr_rendered_pages", fake_ocr)
+
+    fields = backend.extract_from_pdf(str(workdir / "scan.pdf"))
+
+    assert calls == [([0, 1, 2], backend.OCR_RENDER_ZOOM), ([1], backend.OCR_RETRY_ZOOM)]
+    assert ("Ravi", 1) in [(field['text'], field['page']) for field in fields]